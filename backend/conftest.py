@@ -0,0 +1,15 @@
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('DB_ENGINE', 'django.db.backends.sqlite3')
+os.environ.setdefault('DB_NAME', 'foodgram-test.sqlite3')
+# Файловая база, чтобы потоки в test_concurrency делили одну базу.
+os.environ.setdefault('DB_TEST_NAME', 'test-foodgram.sqlite3')
+os.environ.setdefault('DJANGO_KEY', 'test-secret-key')
+os.environ.setdefault(
+    'CACHE_BACKEND',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+django.setup()
@@ -0,0 +1,141 @@
+import logging
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.fields import Field
+from rest_framework.serializers import BaseSerializer
+
+from .profiling import fingerprint, view_name
+
+logger = logging.getLogger(__name__)
+
+SAVEPOINT = re.compile(r'^(?:RELEASE |ROLLBACK TO )?SAVEPOINT ')
+# Общие методы DRF: место запроса в них определяется полем, а не методом.
+FIELD_METHODS = {
+    'to_representation', 'get_attribute', 'run_validation',
+    'to_internal_value', 'data', 'many_init', '__iter__',
+}
+STACK_DEPTH = 8
+
+_local = threading.local()
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def should_raise():
+    """Под pytest обнаруженный N+1 роняет тест, иначе пишется в лог."""
+    return settings.NPLUSONE_RAISE or 'PYTEST_CURRENT_TEST' in os.environ
+
+
+def serializer_origin(frame):
+    """Поле или метод сериализатора, из которого выполнен запрос."""
+    while frame is not None:
+        instance = frame.f_locals.get('self')
+        if isinstance(instance, Field):
+            method = frame.f_code.co_name
+            if isinstance(instance, BaseSerializer) and (
+                method not in FIELD_METHODS
+            ):
+                return f'{type(instance).__name__}.{method}'
+            parent = instance.parent
+            if parent is not None and instance.field_name:
+                return f'{type(parent).__name__}.{instance.field_name}'
+        frame = frame.f_back
+    return None
+
+
+def project_stack(frame):
+    """Кадры кода проекта без Django, DRF и самого детектора."""
+    lines = []
+    while frame is not None and len(lines) < STACK_DEPTH:
+        path = frame.f_code.co_filename
+        if (
+            path.startswith(settings.BASE_DIR)
+            and 'site-packages' not in path
+            and path != __file__
+        ):
+            lines.append(
+                f'{os.path.relpath(path, settings.BASE_DIR)}:'
+                f'{frame.f_lineno} in {frame.f_code.co_name}'
+            )
+        frame = frame.f_back
+    return lines
+
+
+class Detector:
+    """Считает шаблоны SQL в пределах запроса или теста."""
+
+    def __init__(self, endpoint=None, threshold=None):
+        self.endpoint = endpoint
+        self.threshold = threshold or settings.NPLUSONE_THRESHOLD
+        self.queries = Counter()
+        self.reports = []
+
+    def allowed(self, origin):
+        allowlist = settings.NPLUSONE_ALLOWLIST.get(self.endpoint, ())
+        return '*' in allowlist or origin in allowlist
+
+    def record_query(self, execute, sql, params, many, context):
+        if not SAVEPOINT.match(sql):
+            template = fingerprint(sql)
+            self.queries[template] += 1
+            if self.queries[template] == self.threshold + 1:
+                self.report(template, sys._getframe(1))
+        return execute(sql, params, many, context)
+
+    def report(self, template, frame):
+        origin = serializer_origin(frame)
+        if self.allowed(origin):
+            return
+        self.reports.append((template, origin))
+        message = (
+            f'N+1: запрос выполнен больше {self.threshold} раз '
+            f'в {self.endpoint or "тесте"}, источник {origin or "неизвестен"}'
+            f': {template}'
+        )
+        if should_raise():
+            raise NPlusOneError(message)
+        logger.warning(
+            '%s\n  %s', message, '\n  '.join(project_stack(frame)),
+        )
+
+
+@contextmanager
+def detect_n_plus_one(endpoint=None, threshold=None):
+    """Проверяет на N+1 запросы внутри блока, например в тесте."""
+    detector = Detector(endpoint, threshold)
+    previous, _local.detector = getattr(_local, 'detector', None), detector
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(detector.record_query)
+                )
+            yield detector
+    finally:
+        _local.detector = previous
+
+
+class NPlusOneMiddleware:
+    """Ищет N+1 в каждом запросе, включается NPLUSONE_ENABLED."""
+
+    def __init__(self, get_response):
+        if not settings.NPLUSONE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with detect_n_plus_one():
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.detector.endpoint = view_name(view_func, request)
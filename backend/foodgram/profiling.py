@@ -0,0 +1,267 @@
+import random
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+from rest_framework.serializers import BaseSerializer
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+SPACES = re.compile(r'\s+')
+
+_local = threading.local()
+
+
+def fingerprint(sql):
+    """Шаблон запроса без литералов: одинаков для всех значений параметров."""
+    sql = STRING.sub("'?'", sql)
+    sql = NUMBER.sub('N', sql)
+    sql = IN_LIST.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def current_profile():
+    return getattr(_local, 'profile', None)
+
+
+class Profile:
+    """Время запроса, базы и сериализации и шаблоны выполненных SQL."""
+
+    def __init__(self):
+        self.wall = 0.0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.queries = Counter()
+        self._serializing = 0
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicates(self):
+        return {
+            template: count
+            for template, count in self.queries.items()
+            if count > 1
+        }
+
+    def record_query(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += perf_counter() - started
+            self.queries[fingerprint(sql)] += 1
+
+    @contextmanager
+    def capture(self):
+        previous, _local.profile = current_profile(), self
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.record_query)
+                    )
+                yield self
+        finally:
+            self.wall += perf_counter() - started
+            _local.profile = previous
+
+    @contextmanager
+    def serializing(self):
+        # Вложенные сериализаторы уже учтены во внешнем.
+        self._serializing += 1
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self._serializing -= 1
+            if not self._serializing:
+                self.serializer += perf_counter() - started
+
+    def server_timing(self):
+        return ', '.join((
+            f'total;dur={self.wall * 1000:.1f}',
+            f'db;dur={self.db * 1000:.1f};desc="{self.query_count} queries"',
+            f'serializer;dur={self.serializer * 1000:.1f}',
+        ))
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class ViewMetrics:
+
+    def __init__(self):
+        self.wall = Histogram(DURATION_BUCKETS)
+        self.db = Histogram(DURATION_BUCKETS)
+        self.serializer = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.duplicates = Counter()
+
+
+class Metrics:
+    """Агрегаты по представлениям в памяти процесса."""
+
+    HISTOGRAMS = {
+        'wall': ('foodgram_request_duration_seconds', 'Время ответа'),
+        'db': ('foodgram_db_duration_seconds', 'Время запросов к базе'),
+        'serializer': (
+            'foodgram_serializer_duration_seconds',
+            'Время сериализации',
+        ),
+        'queries': ('foodgram_db_queries', 'Число запросов к базе'),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewMetrics)
+
+    def observe(self, view, profile):
+        with self.lock:
+            metrics = self.views[view]
+            metrics.wall.observe(profile.wall)
+            metrics.db.observe(profile.db)
+            metrics.serializer.observe(profile.serializer)
+            metrics.queries.observe(profile.query_count)
+            for template, count in profile.duplicates.items():
+                if (
+                    template in metrics.duplicates
+                    or len(metrics.duplicates)
+                    < settings.PROFILING_MAX_FINGERPRINTS
+                ):
+                    metrics.duplicates[template] += count - 1
+
+    def export(self):
+        with self.lock:
+            views = sorted(self.views.items())
+            lines = []
+            for field, (name, description) in self.HISTOGRAMS.items():
+                lines += [f'# HELP {name} {description}',
+                          f'# TYPE {name} histogram']
+                for view, metrics in views:
+                    lines += getattr(metrics, field).lines(
+                        name, f'view="{view}"',
+                    )
+            name = 'foodgram_duplicate_queries_total'
+            lines += [f'# HELP {name} Повторы одинаковых запросов',
+                      f'# TYPE {name} counter']
+            for view, metrics in views:
+                for template, count in metrics.duplicates.most_common():
+                    query = template.replace('\\', '\\\\').replace('"', '\\"')
+                    lines.append(
+                        f'{name}{{view="{view}",query="{query}"}} {count}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+metrics_registry = Metrics()
+
+
+def instrument_serializers():
+    """Оборачивает BaseSerializer.data, чтобы замерять сериализацию."""
+    original = BaseSerializer.data.fget
+    if getattr(original, 'profiled', False):
+        return
+
+    def data(self):
+        profile = current_profile()
+        if profile is None:
+            return original(self)
+        with profile.serializing():
+            return original(self)
+
+    data.profiled = True
+    BaseSerializer.data = property(data)
+
+
+def view_name(view_func, request):
+    """RecipeViewSet.list, SubscriptionListView или имя функции."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__qualname__', repr(view_func))
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    if action:
+        return f'{view_class.__name__}.{action}'
+    return view_class.__name__
+
+
+class ProfilingMiddleware:
+    """Замеряет часть запросов и пишет итоги в Server-Timing и метрики."""
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        instrument_serializers()
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        profile = Profile()
+        with profile.capture():
+            response = self.get_response(request)
+        view = getattr(request, 'profiling_view', 'unresolved')
+        response['Server-Timing'] = profile.server_timing()
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, profile, view,
+            )
+        else:
+            metrics_registry.observe(view, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profiling_view = view_name(view_func, request)
+
+    def stream(self, content, profile, view):
+        try:
+            with profile.capture():
+                yield from content
+        finally:
+            metrics_registry.observe(view, profile)
+
+
+def metrics(request):
+    """Метрики в формате Prometheus, доступны только с локальных адресов."""
+    if request.META.get('REMOTE_ADDR') not in settings.PROFILING_METRICS_IPS:
+        raise Http404
+    return HttpResponse(
+        metrics_registry.export(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -29,6 +29,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.profiling.ProfilingMiddleware',
+    'foodgram.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,9 +68,30 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        'TEST': {
+            'NAME': os.getenv('DB_TEST_NAME'),
+        },
     }
 }
 
+# Версии тегов ответов и индексов должны быть общими для всех воркеров
+# и manage.py, поэтому по умолчанию кэш лежит в базе (createcachetable).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.db.DatabaseCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'django_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
+}
+
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -96,6 +119,7 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -117,6 +141,26 @@ REST_FRAMEWORK = {
     ]
 }
 
+INGREDIENT_AUTOCOMPLETE_LIMIT = 20
+RECIPE_SEARCH_FALLBACK_LIMIT = 1000
+WHAT_CAN_I_COOK_LIMIT = 20
+WHAT_CAN_I_COOK_MAX_LIMIT = 100
+WHAT_CAN_I_COOK_MAX_INGREDIENTS = 50
+RECIPE_BATCH_MAX_SIZE = 100
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_BACKFILL_LIMIT = 100
+FEED_MAX_LIMIT = 100
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 1))
+PROFILING_METRICS_IPS = ('127.0.0.1', '::1')
+PROFILING_MAX_FINGERPRINTS = 50
+
+NPLUSONE_ENABLED = os.getenv('NPLUSONE_ENABLED', 'True') == 'True'
+NPLUSONE_RAISE = os.getenv('NPLUSONE_RAISE', 'False') == 'True'
+NPLUSONE_THRESHOLD = 3
+NPLUSONE_ALLOWLIST = {}
+
 MAILING_EMAIL = 'Some@mail.ru'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
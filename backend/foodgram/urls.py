@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from .profiling import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("users.urls")),
     path("api/", include("recipes.urls")),
+    path("metrics/", metrics),
 ]
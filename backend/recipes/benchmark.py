@@ -0,0 +1,348 @@
+import random
+import statistics
+import time
+from itertools import islice
+
+from django.db import connections
+from django.db.models import Count, F, Max
+
+from users.models import Follow, User
+from users.paginations import invalidate_counts
+from .caching import invalidate
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, ShoppingCartTotal, Tag)
+from .search import (ingredient_index, pantry_index, recipe_search_index,
+                     update_search_vectors)
+
+BENCHMARK_PREFIX = 'bench'
+SYLLABLES = (
+    'ка', 'ро', 'ми', 'со', 'лу', 'ше', 'ня', 'ты', 'ва', 'ре',
+    'по', 'да', 'ле', 'гу', 'бо', 'зе', 'фи', 'на', 'хо', 'жи',
+)
+INSERT_CHUNK_SIZE = 10000
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+def bulk_insert(model, objects, batch_size, ignore_conflicts=False):
+    """bulk_create кусками: сам bulk_create собирает весь список в память."""
+    objects = iter(objects)
+    while True:
+        chunk = list(islice(objects, batch_size or INSERT_CHUNK_SIZE))
+        if not chunk:
+            return
+        model.objects.bulk_create(
+            chunk,
+            batch_size=batch_size,
+            ignore_conflicts=ignore_conflicts,
+        )
+
+
+def word(rng, syllables=3):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(syllables))
+
+
+def new_ids(model, before):
+    return list(model.objects.filter(id__gt=before or 0).order_by(
+        'id',
+    ).values_list('id', flat=True))
+
+
+def last_id(model):
+    return model.objects.aggregate(last=Max('id'))['last']
+
+
+def generate_dataset(recipes=10000, users=1000, ingredients=2000, tags=12,
+                     follows=20, favorites=30, cart=5, seed=0,
+                     batch_size=2000, log=None):
+    """Наполняет базу детерминированным набором данных для замеров."""
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    if connections['default'].vendor != 'postgresql':
+        # Django 2.2 не ограничивает явный batch_size лимитами SQLite.
+        batch_size = None
+
+    before = last_id(User)
+    bulk_insert(
+        User,
+        (
+            User(
+                username=f'{BENCHMARK_PREFIX}-{seed}-{number}',
+                email=f'{BENCHMARK_PREFIX}-{seed}-{number}@example.com',
+                first_name=word(rng).title(),
+                last_name=word(rng, 4).title(),
+                password='!',
+            )
+            for number in range(users)
+        ),
+        batch_size,
+    )
+    user_ids = new_ids(User, before)
+    log(f'Пользователей: {len(user_ids)}')
+
+    before = last_id(Ingredient)
+    bulk_insert(
+        Ingredient,
+        (
+            Ingredient(
+                name=f'{word(rng, rng.randint(2, 4))} {number}',
+                measurement_unit=rng.choice(UNITS),
+            )
+            for number in range(ingredients)
+        ),
+        batch_size,
+        ignore_conflicts=True,
+    )
+    ingredient_ids = new_ids(Ingredient, before)
+    log(f'Ингредиентов: {len(ingredient_ids)}')
+
+    before = last_id(Tag)
+    Tag.objects.bulk_create(
+        Tag(
+            name=word(rng, 2),
+            slug=f'{BENCHMARK_PREFIX}-{seed}-{number}',
+            color=f'#{rng.randrange(0x1000000):06x}',
+        )
+        for number in range(tags)
+    )
+    tag_ids = new_ids(Tag, before)
+
+    before = last_id(Recipe)
+    bulk_insert(
+        Recipe,
+        (
+            Recipe(
+                author_id=rng.choice(user_ids),
+                name=' '.join(word(rng) for _ in range(rng.randint(1, 3))),
+                text=' '.join(word(rng) for _ in range(rng.randint(10, 60))),
+                image='recipes/images/benchmark.png',
+                cooking_time=rng.randint(5, 180),
+            )
+            for _ in range(recipes)
+        ),
+        batch_size,
+    )
+    recipe_ids = new_ids(Recipe, before)
+    log(f'Рецептов: {len(recipe_ids)}')
+
+    bulk_insert(
+        RecipeIngredient,
+        (
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredients_id=ingredient_id,
+                amount=rng.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in rng.sample(
+                ingredient_ids,
+                min(rng.randint(3, 12), len(ingredient_ids)),
+            )
+        ),
+        batch_size,
+    )
+    bulk_insert(
+        Recipe.tags.through,
+        (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(tag_ids, min(rng.randint(1, 3), tags))
+        ),
+        batch_size,
+    )
+
+    # Выбор смещён к началу списка по Парето, чтобы были и популярные
+    # авторы и рецепты, и длинный хвост.
+    def skewed(items):
+        return items[min(int(rng.paretovariate(1.2)) - 1, len(items) - 1)]
+
+    def links(model, per_user, targets, field):
+        bulk_insert(
+            model,
+            (
+                model(user_id=user_id, **{field: target})
+                for user_id in user_ids
+                for target in {
+                    skewed(targets) for _ in range(rng.randint(0, per_user))
+                }
+                if model is not Follow or target != user_id
+            ),
+            batch_size,
+            ignore_conflicts=True,
+        )
+
+    links(Follow, follows, user_ids, 'author_id')
+    links(Favorite, favorites, recipe_ids[::-1], 'recipe_id')
+    links(ShoppingCart, cart, recipe_ids[::-1], 'recipe_id')
+    log('Подписки, избранное и корзины созданы')
+
+    Recipe.objects.filter(
+        id__gte=recipe_ids[0],
+    ).with_counted_links().update(
+        favorites_count=F('counted_favorites'),
+        shopping_cart_count=F('counted_shopping_cart'),
+    )
+    new_users = set(user_ids)
+    bulk_insert(
+        ShoppingCartTotal,
+        (
+            ShoppingCartTotal(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=total_amount,
+            )
+            for user_id, ingredient_id, total_amount
+            in ShoppingCartTotal.objects.expected().iterator()
+            if user_id in new_users
+        ),
+        batch_size,
+    )
+    if connections['default'].vendor == 'postgresql':
+        update_search_vectors(recipe_ids)
+    invalidate_counts('recipes', 'users', 'follow')
+    invalidate('recipes', 'tags', 'ingredients')
+    for index in (ingredient_index, recipe_search_index, pantry_index):
+        index.invalidate()
+    log('Счётчики, итоги корзин и индексы пересчитаны')
+    return {
+        'users': user_ids,
+        'recipes': recipe_ids,
+        'ingredients': ingredient_ids,
+        'tags': tag_ids,
+    }
+
+
+def hot_query_context():
+    """Самые нагруженные пользователь, автор, тег и ингредиент базы."""
+    user = User.objects.annotate(
+        follows=Count('follower'),
+    ).order_by('-follows', 'id').first()
+    author = User.objects.annotate(
+        followers=Count('following'),
+    ).order_by('-followers', 'id').first()
+    tag = Tag.objects.annotate(
+        recipes_count=Count('recipes'),
+    ).order_by('-recipes_count', 'id').first()
+    ingredient = Ingredient.objects.order_by('id').first()
+    name = ingredient.name.lower() if ingredient else 'соль'
+    return {
+        'user': user,
+        'author': author,
+        'tag': tag.slug if tag else '',
+        'prefix': name[:3],
+        'substring': name[1:4],
+    }
+
+
+HOT_QUERIES = {
+    'ingredient_prefix': lambda context: Ingredient.objects.filter(
+        name__istartswith=context['prefix'],
+    )[:20],
+    'ingredient_substring': lambda context: Ingredient.objects.filter(
+        name__icontains=context['substring'],
+    )[:20],
+    'recipe_page': lambda context: Recipe.objects.with_flags_for(
+        context['user'],
+    ).order_by('-id')[:6],
+    'recipe_page_by_tag': lambda context: Recipe.objects.filter(
+        tags__slug=context['tag'],
+    ).order_by('-id')[:6],
+    'recipe_page_by_author': lambda context: Recipe.objects.filter(
+        author=context['author'],
+    ).order_by('-id')[:6],
+    'recipe_page_favorited': lambda context: Recipe.objects.filter(
+        favorites__user=context['user'],
+    ).order_by('-id')[:6],
+    'recipe_page_popular': lambda context: Recipe.objects.order_by(
+        '-favorites_count',
+        '-id',
+    )[:6],
+    'subscriptions_page': lambda context: User.objects.filter(
+        following__user=context['user'],
+    ).annotate(recipes_count=Count('recipes')).order_by('username')[:6],
+    'subscription_recipes': lambda context: Recipe.objects.filter(
+        author__following__user=context['user'],
+    ).order_by('-id')[:60],
+    'feed_pull': lambda context: Recipe.objects.filter(
+        fanned_out=False,
+        author__following__user=context['user'],
+    ).order_by('-id')[:6],
+    'author_followers': lambda context: Follow.objects.filter(
+        author=context['author'],
+    ).values_list('user_id', flat=True),
+    'shopping_list': lambda context: ShoppingCartTotal.objects.filter(
+        user=context['user'],
+    ).values_list(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'total_amount',
+    ).order_by('ingredient__name'),
+}
+
+
+def explain(queryset):
+    if connections[queryset.db].vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def time_query(queryset, repeat):
+    """Медиана времени выполнения запроса в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга, share от 0 до 100."""
+    ordered = sorted(values)
+    rank = max(int(round(share / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def api_endpoint_context():
+    context = hot_query_context()
+    recipe = Recipe.objects.order_by('-favorites_count', '-id').first()
+    context['recipe'] = recipe.id if recipe else 0
+    return context
+
+
+# Имя: (авторизованный запрос, путь, функция параметров запроса).
+API_ENDPOINTS = {
+    'recipes_list_anonymous': (
+        False, '/api/recipes/', lambda context: {'page': 2},
+    ),
+    'recipes_list': (
+        True, '/api/recipes/', lambda context: {'page': 2},
+    ),
+    'recipes_list_by_tag': (
+        True, '/api/recipes/', lambda context: {'tags': context['tag']},
+    ),
+    'recipes_list_popular': (
+        True, '/api/recipes/', lambda context: {'ordering': 'popular'},
+    ),
+    'recipes_search': (
+        True, '/api/recipes/', lambda context: {'search': context['prefix']},
+    ),
+    'recipe_detail': (
+        True, '/api/recipes/{recipe}/', lambda context: {},
+    ),
+    'recipes_feed': (
+        True, '/api/recipes/feed/', lambda context: {},
+    ),
+    'download_shopping_cart': (
+        True, '/api/recipes/download_shopping_cart/', lambda context: {},
+    ),
+    'subscriptions': (
+        True,
+        '/api/users/subscriptions/',
+        lambda context: {'recipes_limit': 3},
+    ),
+    'ingredients_search': (
+        False,
+        '/api/ingredients/',
+        lambda context: {'name': context['prefix']},
+    ),
+}
@@ -0,0 +1,150 @@
+import hashlib
+import uuid
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def tag_versions(*tags):
+    cache = response_cache()
+    keys = [f'response-cache:tag:{tag}' for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*tags):
+    response_cache().set_many(
+        {f'response-cache:tag:{tag}': uuid.uuid4().hex for tag in tags},
+        None,
+    )
+
+
+def normalized_query(request):
+    return urlencode(
+        sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        ),
+        doseq=True,
+    )
+
+
+class ResponseTagsMixin:
+    response_cache_tag = None
+
+    def get_response_cache_tags(self):
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if lookup is None:
+            return [self.response_cache_tag]
+        return [f'{self.response_cache_tag}:{lookup}']
+
+
+class CachedResponseMixin(ResponseTagsMixin):
+    """Кэширует list/retrieve для анонимных пользователей."""
+
+    def get_response_cache_key(self, request):
+        raw = '|'.join((
+            request.path,
+            normalized_query(request),
+            *tag_versions(*self.get_response_cache_tags()),
+        ))
+        return 'response-cache:' + hashlib.md5(raw.encode()).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        cache = response_cache()
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve,
+            request,
+            *args,
+            **kwargs,
+        )
+
+
+class ConditionalGetMixin(ResponseTagsMixin):
+    """Отвечает 304 на If-None-Match/If-Modified-Since до сериализации."""
+
+    def get_etag(self, request):
+        tags = self.get_response_cache_tags()
+        if request.user.is_authenticated:
+            tags.append(f'user-state:{request.user.id}')
+        raw = '|'.join((
+            request.path,
+            normalized_query(request),
+            request.accepted_renderer.format,
+            str(request.user.id),
+            *tag_versions(*tags),
+        ))
+        return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+    def get_last_modified(self, request):
+        return None
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        last_modified = self.get_last_modified(request)
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        if last_modified is None and lookup in self.kwargs:
+            # Несуществующий объект: предусловия вроде If-None-Match: *
+            # не должны превращать 404 в 304.
+            return handler(request, *args, **kwargs)
+        if last_modified is not None and request.user.is_anonymous:
+            last_modified = int(last_modified.timestamp())
+        else:
+            last_modified = None
+        etag = self.get_etag(request)
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified,
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve,
+            request,
+            *args,
+            **kwargs,
+        )
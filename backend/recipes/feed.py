@@ -0,0 +1,73 @@
+from django.conf import settings
+
+from users.models import Follow
+from .models import Recipe, TimelineEntry
+
+
+def fan_out(recipe):
+    """Раскладывает новый рецепт по лентам подписчиков автора."""
+    followers = list(Follow.objects.filter(
+        author_id=recipe.author_id,
+    ).order_by().values_list('user_id', flat=True)[
+        :settings.FEED_FANOUT_MAX_FOLLOWERS + 1
+    ])
+    if len(followers) > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                recipe_id=recipe.id,
+                author_id=recipe.author_id,
+            )
+            for user_id in followers
+        ),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    Recipe.objects.filter(id=recipe.id).update(fanned_out=True)
+
+
+def backfill(user_id, author_id):
+    recipe_ids = Recipe.objects.filter(
+        author_id=author_id,
+        fanned_out=True,
+    ).order_by('-id').values_list('id', flat=True)[
+        :settings.FEED_BACKFILL_LIMIT
+    ]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+            )
+            for recipe_id in recipe_ids
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def trim(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def feed_page(user, before, limit):
+    """id рецептов ленты по убыванию, строго меньше before."""
+    pushed = TimelineEntry.objects.filter(user=user)
+    pulled = Recipe.objects.filter(
+        fanned_out=False,
+        author__following__user=user,
+    )
+    if before is not None:
+        pushed = pushed.filter(recipe_id__lt=before)
+        pulled = pulled.filter(id__lt=before)
+    recipe_ids = set(pushed.order_by('-recipe_id').values_list(
+        'recipe_id',
+        flat=True,
+    )[:limit])
+    recipe_ids.update(pulled.order_by('-id').values_list(
+        'id',
+        flat=True,
+    )[:limit])
+    return sorted(recipe_ids, reverse=True)[:limit]
@@ -1,12 +1,11 @@
-from django_filters import (ChoiceFilter, FilterSet, ModelChoiceFilter,
-                            ModelMultipleChoiceFilter)
-from rest_framework.filters import SearchFilter
+from django.conf import settings
+from django_filters import (CharFilter, ChoiceFilter, FilterSet,
+                            ModelChoiceFilter, ModelMultipleChoiceFilter)
 
 from recipes.models import Recipe, Tag, User
+from recipes.search import search_recipes
 
-
-class IngredientFilter(SearchFilter):
-    search_param = 'name'
+POPULAR_ORDERING = ('-favorites_count', '-id')
 
 
 class RecipeFilter(FilterSet):
@@ -24,10 +23,22 @@ class RecipeFilter(FilterSet):
         to_field_name='slug',
         queryset=Tag.objects.all()
     )
+    search = CharFilter(method='filter_search')
+    ordering = ChoiceFilter(
+        choices=(('popular', 'popular'),),
+        method='filter_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
+        fields = (
+            'is_favorited',
+            'is_in_shopping_cart',
+            'author',
+            'tags',
+            'search',
+            'ordering',
+        )
 
     def filter_is_favorited(self, queryset, name, value):
         if int(value) == 1 and not self.request.user.is_anonymous:
@@ -38,3 +49,15 @@ class RecipeFilter(FilterSet):
         if int(value) == 1 and not self.request.user.is_anonymous:
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(
+            queryset,
+            value,
+            settings.RECIPE_SEARCH_FALLBACK_LIMIT,
+        )
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*POPULAR_ORDERING)
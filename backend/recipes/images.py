@@ -0,0 +1,195 @@
+import base64
+import binascii
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.fields import ImageField
+
+from .caching import invalidate
+
+logger = logging.getLogger(__name__)
+
+RENDITION_SIZES = {
+    'small': 320,
+    'medium': 640,
+}
+RENDITION_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+RENDITION_QUALITY = 82
+# Кратно 4, чтобы каждый кусок base64 декодировался независимо.
+DECODE_CHUNK_SIZE = 256 * 1024
+
+_executor = None
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """Декодирует base64 кусками во временный файл на диске."""
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        start = base64_data.find(';base64,')
+        start = 0 if start == -1 else start + len(';base64,')
+        upload = TemporaryUploadedFile('upload', None, 0, None)
+        try:
+            for offset in range(start, len(base64_data), DECODE_CHUNK_SIZE):
+                upload.write(base64.b64decode(
+                    base64_data[offset:offset + DECODE_CHUNK_SIZE],
+                    validate=True,
+                ))
+            upload.size = upload.tell()
+            upload.seek(0)
+            with Image.open(upload) as image:
+                image_format = image.format
+        except (binascii.Error, ValueError, OSError):
+            upload.close()
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        extension = 'jpg' if image_format == 'JPEG' else image_format.lower()
+        if extension not in self.ALLOWED_TYPES:
+            upload.close()
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        upload.seek(0)
+        upload.name = f'{uuid.uuid4()}.{extension}'
+        upload.content_type = Image.MIME.get(image_format)
+        return ImageField.to_internal_value(self, upload)
+
+
+def rendition_name(recipe_id, image_name, size, image_format):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'recipes/renditions/{recipe_id}/{stem}-{size}.{image_format}'
+
+
+def rendition_url(recipe, size, image_format, request=None):
+    """Ссылка на миниатюру или None, если оригинал потерян."""
+    if recipe.renditions_ready:
+        url = default_storage.url(rendition_name(
+            recipe.id, recipe.image.name, size, image_format,
+        ))
+    elif default_storage.exists(recipe.image.name):
+        url = reverse('recipes-image', kwargs={
+            'id': recipe.id,
+            'size': size,
+            'image_format': image_format,
+        })
+    else:
+        return None
+    if request is not None:
+        url = request.build_absolute_uri(url)
+    return url
+
+
+def rendition_urls(recipe, request=None):
+    return {
+        size: {
+            image_format: rendition_url(recipe, size, image_format, request)
+            for image_format in RENDITION_FORMATS
+        }
+        for size in RENDITION_SIZES
+    }
+
+
+def render(image, width, image_format):
+    rendition = image.copy()
+    rendition.thumbnail((width, width * 4), Image.LANCZOS)
+    if rendition.mode not in ('RGB', 'L'):
+        rendition = rendition.convert('RGB')
+    content = BytesIO()
+    rendition.save(
+        content,
+        RENDITION_FORMATS[image_format],
+        quality=RENDITION_QUALITY,
+        optimize=True,
+    )
+    return ContentFile(content.getvalue())
+
+
+def save_rendition(image, recipe_id, image_name, size, image_format):
+    name = rendition_name(recipe_id, image_name, size, image_format)
+    if not default_storage.exists(name):
+        default_storage.save(
+            name,
+            render(image, RENDITION_SIZES[size], image_format),
+        )
+    return name
+
+
+def ensure_rendition(recipe_id, image_name, size, image_format):
+    name = rendition_name(recipe_id, image_name, size, image_format)
+    if default_storage.exists(name):
+        return name
+    with default_storage.open(image_name) as original:
+        with Image.open(original) as image:
+            image.load()
+            return save_rendition(
+                image, recipe_id, image_name, size, image_format,
+            )
+
+
+def build_renditions(recipe_id, image_name):
+    from .models import Recipe
+
+    with default_storage.open(image_name) as original:
+        with Image.open(original) as image:
+            image.load()
+            for size in RENDITION_SIZES:
+                for image_format in RENDITION_FORMATS:
+                    save_rendition(
+                        image, recipe_id, image_name, size, image_format,
+                    )
+    updated = Recipe.objects.filter(id=recipe_id, image=image_name).update(
+        renditions_ready=True,
+        updated_at=timezone.now(),
+    )
+    if updated:
+        invalidate('recipes', f'recipes:{recipe_id}')
+
+
+def run_in_worker(recipe_id, image_name):
+    try:
+        build_renditions(recipe_id, image_name)
+    except Exception:
+        logger.exception(
+            'Не удалось подготовить миниатюры рецепта %s', recipe_id,
+        )
+    finally:
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix='recipe-images',
+        )
+    return _executor
+
+
+def schedule_renditions(recipe):
+    """Ставит нарезку миниатюр в очередь после фиксации транзакции."""
+    recipe_id, image_name = recipe.id, recipe.image.name
+
+    def submit():
+        if settings.RECIPE_IMAGE_WORKERS:
+            get_executor().submit(run_in_worker, recipe_id, image_name)
+        else:
+            build_renditions(recipe_id, image_name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,171 @@
+import json
+import statistics
+import time
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from recipes.benchmark import (API_ENDPOINTS, api_endpoint_context,
+                               percentile)
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержки (p50/p95/p99) и число запросов к базе для '
+        'основных эндпоинтов API и сравнивает с сохранённым замером.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=30,
+            help='Сколько замеров на эндпоинт.',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=3,
+            help='Сколько запросов сделать до замеров.',
+        )
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            choices=sorted(API_ENDPOINTS),
+            help='Замерить только этот эндпоинт, можно несколько раз.',
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument('--save', metavar='PATH')
+        parser.add_argument('--compare', metavar='PATH')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=20,
+            help='Допустимый рост p95 в процентах при сравнении.',
+        )
+
+    def measure(self, client, path, params, headers, options):
+        timings = []
+        queries = 0
+        status_codes = set()
+        for number in range(options['warmup'] + options['requests']):
+            if options['cold']:
+                for cache in caches.all():
+                    cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(path, params, **headers)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = (time.perf_counter() - started) * 1000
+            if number < options['warmup']:
+                continue
+            timings.append(elapsed)
+            queries = max(queries, len(context.captured_queries))
+            status_codes.add(response.status_code)
+        return {
+            'p50': round(percentile(timings, 50), 3),
+            'p95': round(percentile(timings, 95), 3),
+            'p99': round(percentile(timings, 99), 3),
+            'mean': round(statistics.mean(timings), 3),
+            'queries': queries,
+            'status': sorted(status_codes),
+        }
+
+    def compare(self, report, baseline, threshold):
+        regressions = []
+        for name, result in report.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            growth = (result['p95'] / max(before['p95'], 1e-3) - 1) * 100
+            self.stdout.write(
+                f'  {name}: p95 {before["p95"]:.2f} -> {result["p95"]:.2f} мс '
+                f'({growth:+.0f}%), запросов {before["queries"]} -> '
+                f'{result["queries"]}'
+            )
+            if growth > threshold or result['queries'] > before['queries']:
+                regressions.append(name)
+        return regressions
+
+    def load_baseline(self, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)['endpoints']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось прочитать замер: {error}')
+
+    def save(self, path, report, options):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {
+                    'vendor': connection.vendor,
+                    'recipes': Recipe.objects.count(),
+                    'users': User.objects.count(),
+                    'requests': options['requests'],
+                    'cold': options['cold'],
+                    'endpoints': report,
+                },
+                file,
+                ensure_ascii=False,
+                indent=2,
+            )
+        self.stdout.write(f'Замер сохранён в {path}')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должно быть больше нуля')
+        baseline = {}
+        if options['compare']:
+            baseline = self.load_baseline(options['compare'])
+        context = api_endpoint_context()
+        if context['user'] is None:
+            raise CommandError('База пуста, запустите seed_benchmark_data')
+        token, _ = Token.objects.get_or_create(user=context['user'])
+        client = Client(HTTP_HOST='localhost')
+        report = {}
+        self.stdout.write(
+            f'{"эндпоинт":<28}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"запросов":>10}  статус'
+        )
+        for name in options['endpoint'] or API_ENDPOINTS:
+            authorized, path, params = API_ENDPOINTS[name]
+            headers = {}
+            if authorized:
+                headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+            result = self.measure(
+                client,
+                path.format(**context),
+                params(context),
+                headers,
+                options,
+            )
+            report[name] = result
+            self.stdout.write(
+                f'{name:<28}{result["p50"]:>9.2f}{result["p95"]:>9.2f}'
+                f'{result["p99"]:>9.2f}{result["queries"]:>10}  '
+                f'{",".join(map(str, result["status"]))}'
+            )
+        if options['save']:
+            self.save(options['save'], report, options)
+        if baseline:
+            self.stdout.write('Сравнение с замером:')
+            regressions = self.compare(
+                report,
+                baseline,
+                options['threshold'],
+            )
+            if regressions:
+                raise CommandError(
+                    'Регрессия: ' + ', '.join(regressions)
+                )
@@ -0,0 +1,86 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.benchmark import (HOT_QUERIES, explain, generate_dataset,
+                               hot_query_context, time_query)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN (ANALYZE на PostgreSQL) для горячих запросов '
+        'и сравнивает время с сохранённым замером.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--generate',
+            type=int,
+            metavar='RECIPES',
+            help='Сначала сгенерировать набор данных с этим числом рецептов.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Сколько раз выполнить запрос для медианы.',
+        )
+        parser.add_argument(
+            '--query',
+            action='append',
+            choices=sorted(HOT_QUERIES),
+            help='Проверить только этот запрос, можно несколько раз.',
+        )
+        parser.add_argument(
+            '--save',
+            metavar='PATH',
+            help='Сохранить время и планы в JSON, например до миграции.',
+        )
+        parser.add_argument(
+            '--compare',
+            metavar='PATH',
+            help='Сравнить с ранее сохранённым JSON.',
+        )
+        parser.add_argument(
+            '--no-plans',
+            action='store_true',
+            help='Не печатать планы, только время.',
+        )
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            generate_dataset(
+                recipes=options['generate'],
+                users=max(options['generate'] // 10, 10),
+                seed=options['seed'],
+                log=self.stdout.write,
+            )
+        baseline = {}
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Не удалось прочитать замер: {error}')
+        context = hot_query_context()
+        if context['user'] is None:
+            raise CommandError('База пуста, используйте --generate')
+        report = {}
+        for name in options['query'] or HOT_QUERIES:
+            queryset = HOT_QUERIES[name](context)
+            plan = explain(queryset)
+            elapsed = time_query(queryset, options['repeat'])
+            report[name] = {'ms': round(elapsed, 3), 'plan': plan}
+            line = f'{name}: {elapsed:.2f} мс'
+            if name in baseline:
+                before = baseline[name]['ms']
+                speedup = before / max(elapsed, 1e-3)
+                line += f' (было {before:.2f} мс, x{speedup:.1f})'
+            self.stdout.write(self.style.MIGRATE_HEADING(line))
+            if not options['no_plans']:
+                self.stdout.write(plan)
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Замер сохранён в {options["save"]}')
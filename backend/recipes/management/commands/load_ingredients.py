@@ -0,0 +1,106 @@
+import csv
+import json
+import os
+import re
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.caching import invalidate
+from recipes.models import Ingredient
+from recipes.search import ingredient_index
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'[\s,]*')
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) < 2:
+            continue
+        yield row[0], row[1]
+
+
+def read_json(file):
+    """Построчно читает JSON-массив объектов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив ингредиентов')
+    position = 1
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Файл JSON обрывается на середине')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к ingredients.csv или .json')
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла, по умолчанию по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_create.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = (
+            options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        )
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        before = Ingredient.objects.count()
+        rows = 0
+        started = time.perf_counter()
+        with open(path, encoding='utf-8') as file:
+            ingredients = (
+                (name.strip(), measurement_unit.strip())
+                for name, measurement_unit in READERS[file_format](file)
+            )
+            while True:
+                batch = list(islice(ingredients, options['batch_size']))
+                if not batch:
+                    break
+                rows += len(batch)
+                Ingredient.objects.bulk_create(
+                    (
+                        Ingredient(name=name, measurement_unit=unit)
+                        for name, unit in dict.fromkeys(batch)
+                    ),
+                    ignore_conflicts=True,
+                )
+        elapsed = time.perf_counter() - started
+        ingredient_index.invalidate()
+        # bulk_create не шлёт сигналы, кэш ответов и ETag сбрасываются здесь.
+        invalidate('ingredients')
+        created = Ingredient.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {rows} строк, добавлено {created} ингредиентов '
+            f'за {elapsed:.2f} с ({rows / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
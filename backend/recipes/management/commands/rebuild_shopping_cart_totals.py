@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает итоги корзин покупок или проверяет их расхождение.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить сохранённые итоги с корзинами.',
+        )
+
+    def handle(self, *args, **options):
+        expected = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShoppingCartTotal.objects.expected().iterator()
+        }
+        stored = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShoppingCartTotal.objects.values_list(
+                'user_id',
+                'ingredient_id',
+                'total_amount',
+            ).iterator()
+        }
+        drift = {
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        }
+        self.stdout.write(
+            f'Итогов: {len(expected)}, расхождений: {len(drift)}'
+        )
+        if not drift:
+            return
+        if options['check']:
+            for user_id, ingredient_id in sorted(drift)[:20]:
+                self.stdout.write(
+                    f'user={user_id} ingredient={ingredient_id}: '
+                    f'ожидается {expected.get((user_id, ingredient_id), 0)}, '
+                    f'сохранено {stored.get((user_id, ingredient_id), 0)}'
+                )
+            raise CommandError('Итоги корзин расходятся с корзинами')
+        with transaction.atomic():
+            ShoppingCartTotal.objects.all().delete()
+            ShoppingCartTotal.objects.bulk_create(
+                (
+                    ShoppingCartTotal(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=total_amount,
+                    )
+                    for (user_id, ingredient_id), total_amount
+                    in expected.items()
+                ),
+                batch_size=1000,
+            )
+        self.stdout.write(self.style.SUCCESS('Итоги корзин пересчитаны'))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+
+from recipes.caching import invalidate
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики избранного и корзин рецептов с таблицами связей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения.',
+        )
+
+    def handle(self, *args, **options):
+        drift = Recipe.objects.with_counted_links().filter(
+            ~Q(favorites_count=F('counted_favorites'))
+            | ~Q(shopping_cart_count=F('counted_shopping_cart'))
+        ).order_by('id').values_list(
+            'id',
+            'favorites_count',
+            'counted_favorites',
+            'shopping_cart_count',
+            'counted_shopping_cart',
+        )
+        drift = list(drift)
+        self.stdout.write(f'Расхождений: {len(drift)}')
+        if not drift:
+            return
+        if options['check']:
+            for recipe_id, *counters in drift[:20]:
+                self.stdout.write(
+                    'recipe={}: избранное {} вместо {}, '
+                    'корзины {} вместо {}'.format(recipe_id, *counters)
+                )
+            raise CommandError('Счётчики рецептов расходятся со связями')
+        Recipe.objects.filter(
+            id__in=[recipe_id for recipe_id, *_ in drift],
+        ).with_counted_links().update(
+            favorites_count=F('counted_favorites'),
+            shopping_cart_count=F('counted_shopping_cart'),
+        )
+        invalidate('recipes-popular')
+        self.stdout.write(self.style.SUCCESS('Счётчики рецептов пересчитаны'))
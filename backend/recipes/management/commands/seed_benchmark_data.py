@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.benchmark import generate_dataset
+
+
+class Command(BaseCommand):
+    help = 'Генерирует данные для нагрузочных замеров пачками bulk_create.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=12)
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=20,
+            help='Максимум подписок на пользователя.',
+        )
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=30,
+            help='Максимум рецептов в избранном у пользователя.',
+        )
+        parser.add_argument(
+            '--cart',
+            type=int,
+            default=5,
+            help='Максимум рецептов в корзине у пользователя.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно генератора, разные зёрна не пересекаются по именам.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Размер пачки для bulk_create на PostgreSQL.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        generate_dataset(
+            recipes=options['recipes'],
+            users=options['users'],
+            ingredients=options['ingredients'],
+            tags=options['tags'],
+            follows=options['follows'],
+            favorites=options['favorites'],
+            cart=options['cart'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные сгенерированы за {time.perf_counter() - started:.1f} с'
+        ))
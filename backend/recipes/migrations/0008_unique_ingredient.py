@@ -0,0 +1,67 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+def merge_links(queryset, link_field, owner_field, amount_field, survivor,
+                duplicate):
+    """Переносит строки дубликата на оставшийся ингредиент."""
+    kept = {
+        getattr(link, owner_field): link
+        for link in queryset.filter(**{link_field: survivor})
+    }
+    for link in queryset.filter(**{link_field: duplicate}):
+        target = kept.get(getattr(link, owner_field))
+        if target is None:
+            setattr(link, f'{link_field}_id', survivor)
+            link.save(update_fields=[link_field])
+            continue
+        setattr(
+            target,
+            amount_field,
+            getattr(target, amount_field) + getattr(link, amount_field),
+        )
+        target.save(update_fields=[amount_field])
+        link.delete()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    groups = Ingredient.objects.values(
+        'name',
+        'measurement_unit',
+    ).annotate(
+        survivor=models.Min('id'),
+        copies=models.Count('id'),
+    ).filter(copies__gt=1).order_by()
+    for group in groups.iterator():
+        duplicates = Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).exclude(id=group['survivor']).values_list('id', flat=True)
+        for duplicate in list(duplicates):
+            merge_links(RecipeIngredient.objects, 'ingredients', 'recipe_id',
+                        'amount', group['survivor'], duplicate)
+            merge_links(ShoppingCartTotal.objects, 'ingredient', 'user_id',
+                        'total_amount', group['survivor'], duplicate)
+        Ingredient.objects.filter(id__in=list(duplicates)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_shoppingcarttotal'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients,
+            migrations.RunPython.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
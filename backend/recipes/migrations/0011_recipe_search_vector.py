@@ -0,0 +1,49 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:12
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_INDEX = 'recipes_recipe_search_vector_gin'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX {SEARCH_INDEX} ON recipes_recipe '
+        'USING gin (search_vector)'
+    )
+    schema_editor.execute('''
+        UPDATE recipes_recipe AS recipe SET search_vector =
+            setweight(to_tsvector('russian', recipe.name), 'A')
+            || setweight(to_tsvector('russian', coalesce((
+                SELECT string_agg(ingredient.name, ' ')
+                FROM recipes_recipeingredient AS line
+                JOIN recipes_ingredient AS ingredient
+                    ON ingredient.id = line.ingredients_id
+                WHERE line.recipe_id = recipe.id
+            ), '')), 'B')
+            || setweight(to_tsvector('russian', recipe.text), 'C')
+    ''')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_renditions_ready'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
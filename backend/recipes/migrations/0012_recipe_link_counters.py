@@ -0,0 +1,54 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_link_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+
+    def link_count(model_name):
+        model = apps.get_model('recipes', model_name)
+        return Coalesce(
+            Subquery(
+                model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+                    'recipe',
+                ).annotate(links=Count('id')).values('links'),
+                output_field=models.IntegerField(),
+            ),
+            0,
+        )
+
+    Recipe.objects.update(
+        favorites_count=link_count('Favorite'),
+        shopping_cart_count=link_count('ShoppingCart'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_popular'),
+        ),
+        migrations.RunPython(
+            fill_link_counters,
+            migrations.RunPython.noop,
+        ),
+    ]
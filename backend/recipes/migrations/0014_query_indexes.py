@@ -0,0 +1,70 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+# Выражения совпадают с тем, что Django генерирует для istartswith и
+# icontains на PostgreSQL: UPPER("name"::text) LIKE UPPER(%s).
+POSTGRES_INDEXES = (
+    (
+        'ingredient_name_prefix',
+        'CREATE INDEX ingredient_name_prefix ON recipes_ingredient '
+        '(UPPER(name::text) text_pattern_ops)',
+    ),
+    (
+        'ingredient_name_trgm',
+        'CREATE INDEX ingredient_name_trgm ON recipes_ingredient '
+        'USING gin (UPPER(name::text) gin_trgm_ops)',
+    ),
+    (
+        'recipe_author_pull',
+        'CREATE INDEX recipe_author_pull ON recipes_recipe '
+        '(author_id, id DESC) WHERE NOT fanned_out',
+    ),
+)
+
+
+def create_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for _, sql in POSTGRES_INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in POSTGRES_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_timeline'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='favorite',
+            options={'verbose_name': 'Избранное', 'verbose_name_plural': 'Избранные'},
+        ),
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'verbose_name': 'Рецепт', 'verbose_name_plural': 'Рецепты'},
+        ),
+        migrations.AlterModelOptions(
+            name='recipeingredient',
+            options={'verbose_name': 'Ингредиент в рецепте', 'verbose_name_plural': 'Ингредиенты в рецептах'},
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_recent'),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipe_tags_tag_recipe',
+        ),
+        migrations.RunPython(create_postgres_indexes, drop_postgres_indexes),
+    ]
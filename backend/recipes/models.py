@@ -1,8 +1,15 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (BooleanField, Case, Count, Exists, F,
+                              IntegerField, OuterRef, Prefetch, Subquery, Sum,
+                              Value, When, Window)
+from django.db.models.functions import Coalesce, RowNumber
 
 from users.models import User
 
+UPSERT_BATCH_SIZE = 300
+
 
 class Tag(models.Model):
     name = models.CharField(
@@ -20,6 +27,11 @@ class Tag(models.Model):
         unique=True,
         verbose_name='Cлаг',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Изменено',
+    )
 
     class Meta:
         verbose_name = 'Тег'
@@ -39,8 +51,19 @@ class Ingredient(models.Model):
         max_length=200,
         verbose_name='Единица измерения',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Изменено',
+    )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient',
+            ),
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -50,6 +73,83 @@ class Ingredient(models.Model):
         return self.name
 
 
+def supports_returning(connection):
+    """Есть ли INSERT ... ON CONFLICT и RETURNING: PostgreSQL, SQLite 3.35+."""
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.vendor == 'postgresql'
+
+
+def link_count(model):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+                'recipe',
+            ).annotate(links=Count('id')).values('links'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_flags_for(self, user):
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user,
+                recipe=OuterRef('pk'),
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user,
+                recipe=OuterRef('pk'),
+            )),
+        )
+
+    def with_related_for(self, user):
+        """Страница рецептов со всеми вложенными данными за 3 запроса."""
+        return self.with_flags_for(user).select_related(
+            'author',
+        ).defer(
+            'search_vector',
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredients_recipe',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredients'
+                ),
+            ),
+        )
+
+    def with_counted_links(self):
+        """Фактическое число добавлений в избранное и в корзины."""
+        return self.annotate(
+            counted_favorites=link_count(Favorite),
+            counted_shopping_cart=link_count(ShoppingCart),
+        )
+
+    def limit_per_author(self, limit):
+        """Не больше limit последних рецептов каждого автора."""
+        ranked = self.annotate(recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=F('id').desc(),
+        )).values('id', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.extra(
+            where=[
+                f'{self.model._meta.db_table}.id IN ('
+                f'SELECT id FROM ({sql}) AS ranked WHERE recipe_rank <= %s)'
+            ],
+            params=(*params, limit),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -68,6 +168,11 @@ class Recipe(models.Model):
         verbose_name="Изображение",
         upload_to="recipes/images/",
     )
+    renditions_ready = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Миниатюры готовы',
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         verbose_name='Ингредиенты',
@@ -84,14 +189,46 @@ class Recipe(models.Model):
         default=1,
         verbose_name='Время приготовления (мин.)',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Изменено',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах',
+    )
+    fanned_out = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Разослан в ленты',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('name',)
-
-    def favorites_count(self):
-        return self.favorites.count()
+        indexes = [
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_popular',
+            ),
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_author_recent',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -122,12 +259,73 @@ class RecipeIngredient(models.Model):
         ]
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецептах'
-        ordering = ('recipe',)
 
     def __str__(self):
         return self.recipe.name
 
 
+class RecipeLinkQuerySet(models.QuerySet):
+    """Избранное и корзина: изменения берут рецепты из RETURNING."""
+
+    def add_many(self, user, recipe_ids):
+        """Добавляет существующие рецепты, которых ещё нет у user."""
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return set()
+        if supports_returning(connections[self.db]):
+            return self.returning_recipe_ids(
+                f'INSERT INTO {self.model._meta.db_table} '
+                f'(user_id, recipe_id) SELECT %s, id '
+                f'FROM {Recipe._meta.db_table} WHERE id IN '
+                f'({", ".join(["%s"] * len(recipe_ids))}) '
+                'ON CONFLICT DO NOTHING RETURNING recipe_id',
+                [user.id, *recipe_ids],
+            )
+        added = set(Recipe.objects.filter(
+            id__in=recipe_ids,
+        ).values_list('id', flat=True)) - set(self.filter(
+            user=user,
+            recipe_id__in=recipe_ids,
+        ).values_list('recipe_id', flat=True))
+        self.bulk_create(
+            (
+                self.model(user=user, recipe_id=recipe_id)
+                for recipe_id in added
+            ),
+            ignore_conflicts=True,
+        )
+        return added
+
+    def remove_many(self, user, recipe_ids=None):
+        """Удаляет рецепты recipe_ids или, если их нет, все связи."""
+        if recipe_ids is not None:
+            recipe_ids = list(recipe_ids)
+            if not recipe_ids:
+                return set()
+        if supports_returning(connections[self.db]):
+            sql = f'DELETE FROM {self.model._meta.db_table} WHERE user_id = %s'
+            params = [user.id]
+            if recipe_ids is not None:
+                placeholders = ', '.join(['%s'] * len(recipe_ids))
+                sql += f' AND recipe_id IN ({placeholders})'
+                params += recipe_ids
+            return self.returning_recipe_ids(
+                f'{sql} RETURNING recipe_id',
+                params,
+            )
+        links = self.filter(user=user)
+        if recipe_ids is not None:
+            links = links.filter(recipe_id__in=recipe_ids)
+        removed = set(links.values_list('recipe_id', flat=True))
+        links.filter(recipe_id__in=removed).delete()
+        return removed
+
+    def returning_recipe_ids(self, sql, params):
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return {recipe_id for recipe_id, in cursor.fetchall()}
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(
         User,
@@ -140,6 +338,8 @@ class Favorite(models.Model):
         related_name='favorites',
     )
 
+    objects = RecipeLinkQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -149,7 +349,6 @@ class Favorite(models.Model):
         ]
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
-        ordering = ('user',)
 
     def __str__(self):
         return f'{self.user} -> {self.recipe}'
@@ -167,6 +366,8 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart',
     )
 
+    objects = RecipeLinkQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -179,3 +380,169 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user}, {self.recipe}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='timeline_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author',
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
+
+
+class ShoppingCartTotalQuerySet(models.QuerySet):
+    def apply(self, user_ids, amounts):
+        """Прибавляет amounts {id ингредиента: доза} к итогам пользователей."""
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        if not user_ids or not amounts:
+            return
+        with transaction.atomic(using=self.db):
+            totals = self.filter(
+                user_id__in=user_ids,
+                ingredient_id__in=amounts,
+            )
+            if supports_returning(connections[self.db]):
+                self.upsert(user_ids, amounts)
+            else:
+                self.update_or_create_totals(totals, user_ids, amounts)
+            totals.filter(total_amount__lte=0).delete()
+
+    def upsert(self, user_ids, amounts):
+        # Строки идут в одном порядке, чтобы параллельные upsert
+        # не ждали друг друга крест-накрест.
+        rows = sorted(
+            (user_id, ingredient_id, amount)
+            for user_id in set(user_ids)
+            for ingredient_id, amount in amounts.items()
+        )
+        table = self.model._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+                batch = rows[start:start + UPSERT_BATCH_SIZE]
+                cursor.execute(
+                    f'INSERT INTO {table} '
+                    '(user_id, ingredient_id, total_amount) VALUES '
+                    + ', '.join(['(%s, %s, %s)'] * len(batch))
+                    + ' ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                    f'SET total_amount = {table}.total_amount '
+                    '+ EXCLUDED.total_amount',
+                    [value for row in batch for value in row],
+                )
+
+    def update_or_create_totals(self, totals, user_ids, amounts):
+        existing = set(totals.values_list(
+            'user_id',
+            'ingredient_id',
+        ))
+        totals.update(total_amount=F('total_amount') + Case(
+            *(
+                When(ingredient_id=ingredient_id, then=Value(amount))
+                for ingredient_id, amount in amounts.items()
+            ),
+            output_field=IntegerField(),
+        ))
+        self.bulk_create(
+            self.model(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=amount,
+            )
+            for user_id in user_ids
+            for ingredient_id, amount in amounts.items()
+            if amount > 0 and (user_id, ingredient_id) not in existing
+        )
+
+    def expected(self):
+        return RecipeIngredient.objects.filter(
+            recipe__shopping_cart__isnull=False,
+        ).values_list(
+            'recipe__shopping_cart__user',
+            'ingredients',
+        ).annotate(total_amount=Sum('amount')).order_by()
+
+    def recipe_amounts(self, recipe_id, sign=1):
+        return {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in RecipeIngredient.objects.filter(
+                recipe_id=recipe_id,
+            ).values_list('ingredients_id', 'amount')
+        }
+
+    def recipes_amounts(self, recipe_ids, sign=1):
+        return {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids,
+            ).order_by().values('ingredients_id').annotate(
+                total=Sum('amount'),
+            ).values_list('ingredients_id', 'total')
+        }
+
+    def add_recipe(self, user, recipe_id):
+        self.apply([user.id], self.recipe_amounts(recipe_id))
+
+    def remove_recipe(self, user, recipe_id):
+        self.apply([user.id], self.recipe_amounts(recipe_id, sign=-1))
+
+
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+    )
+    total_amount = models.IntegerField(
+        verbose_name='Итого',
+    )
+
+    objects = ShoppingCartTotalQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='shopping_cart_total',
+            ),
+        ]
+        verbose_name = 'Итог корзины'
+        verbose_name_plural = 'Итоги корзин'
+
+    def __str__(self):
+        return f'{self.user}, {self.ingredient}: {self.total_amount}'
@@ -0,0 +1,68 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer):
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return ''.join(f'{key}: {value}\n' for key, value in data.items())
+        return str(data)
+
+    def stream(self, ingredients):
+        raise NotImplementedError('.stream() must be implemented.')
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        for name, measurement_unit, amount in ingredients:
+            yield f'{name}\t -- {amount}\t({measurement_unit})\n'
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for name, measurement_unit, amount in ingredients:
+            yield writer.writerow((name, amount, measurement_unit))
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False)
+
+    def stream(self, ingredients):
+        separator = '['
+        for name, measurement_unit, amount in ingredients:
+            ingredient = {
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            }
+            yield separator + json.dumps(ingredient, ensure_ascii=False)
+            separator = ',\n'
+        yield ']' if separator == ',\n' else '[]'
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+)
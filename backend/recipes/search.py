@@ -0,0 +1,430 @@
+import bisect
+import re
+import threading
+import uuid
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, When
+
+from .models import Ingredient, Recipe, RecipeIngredient
+
+SEARCH_CONFIG = 'russian'
+# Веса те же, что у ts_rank по умолчанию для меток A, B и C.
+SEARCH_WEIGHTS = {
+    'name': 1.0,
+    'ingredients': 0.4,
+    'text': 0.2,
+}
+TOKEN = re.compile(r'\w+')
+SEARCH_VECTOR_SQL = '''
+    UPDATE {recipe} AS recipe SET search_vector =
+        setweight(to_tsvector(%s::regconfig, recipe.name), 'A')
+        || setweight(to_tsvector(%s::regconfig, coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM {recipe_ingredient} AS line
+            JOIN {ingredient} AS ingredient
+                ON ingredient.id = line.ingredients_id
+            WHERE line.recipe_id = recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector(%s::regconfig, recipe.text), 'C')
+    WHERE recipe.id = ANY(%s)
+'''
+
+
+class VersionedIndex:
+    """Индекс в памяти процесса, версия которого лежит в общем кэше."""
+    version_key = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+
+    def current_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        return version
+
+    def invalidate(self):
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    def rebuild(self):
+        raise NotImplementedError('.rebuild() must be implemented.')
+
+    def ensure_loaded(self):
+        """Вызывается под self._lock."""
+        version = self.current_version()
+        if version != self._version:
+            self.rebuild()
+            self._version = version
+
+
+class IncrementalIndex(VersionedIndex):
+    """Индекс рецептов, который обновляется точечно."""
+
+    def apply(self, recipe_ids):
+        raise NotImplementedError('.apply() must be implemented.')
+
+    def update(self, recipe_ids):
+        version = self.current_version()
+        with self._lock:
+            in_sync = version == self._version
+            if in_sync:
+                self.apply(set(recipe_ids))
+            version = uuid.uuid4().hex
+            cache.set(self.version_key, version, None)
+            if in_sync:
+                self._version = version
+
+
+class IngredientIndex(VersionedIndex):
+    """Отсортированный индекс названий ингредиентов для автодополнения."""
+    version_key = 'recipes:ingredient-index:version'
+
+    def __init__(self):
+        super().__init__()
+        self._names = []
+        self._ingredients = []
+
+    def rebuild(self):
+        ingredients = sorted(
+            Ingredient.objects.all(),
+            key=lambda ingredient: (ingredient.name.lower(), ingredient.id),
+        )
+        self._names = [ingredient.name.lower() for ingredient in ingredients]
+        self._ingredients = ingredients
+
+    def load(self):
+        with self._lock:
+            self.ensure_loaded()
+            return self._names, self._ingredients
+
+    def search(self, query, limit):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        query = query.strip().lower()
+        names, ingredients = self.load()
+        position = bisect.bisect_left(names, query)
+        results = []
+        while (position < len(names) and len(results) < limit
+               and names[position].startswith(query)):
+            results.append(ingredients[position])
+            position += 1
+        if len(results) < limit:
+            for name, ingredient in zip(names, ingredients):
+                if query in name and not name.startswith(query):
+                    results.append(ingredient)
+                    if len(results) == limit:
+                        break
+        return results
+
+
+ingredient_index = IngredientIndex()
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+class RecipeSearchIndex(IncrementalIndex):
+    """Инвертированный индекс рецептов для баз без полнотекстового поиска."""
+    version_key = 'recipes:recipe-search-index:version'
+
+    def __init__(self):
+        super().__init__()
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self._tokens = None
+
+    def documents(self, recipe_ids=None):
+        recipes = Recipe.objects.order_by()
+        lines = RecipeIngredient.objects.order_by()
+        if recipe_ids is not None:
+            recipes = recipes.filter(id__in=recipe_ids)
+            lines = lines.filter(recipe_id__in=recipe_ids)
+        ingredients = defaultdict(list)
+        for recipe_id, name in lines.values_list(
+            'recipe_id',
+            'ingredients__name',
+        ).iterator():
+            ingredients[recipe_id].append(name)
+        for recipe_id, name, text in recipes.values_list(
+            'id',
+            'name',
+            'text',
+        ).iterator():
+            yield recipe_id, {
+                'name': name,
+                'ingredients': ' '.join(ingredients[recipe_id]),
+                'text': text,
+            }
+
+    def remove(self, recipe_id):
+        for token in self._documents.pop(recipe_id, ()):
+            postings = self._postings[token]
+            postings.pop(recipe_id, None)
+            if not postings:
+                del self._postings[token]
+        self._tokens = None
+
+    def add(self, recipe_id, fields):
+        scores = {}
+        for field, text in fields.items():
+            for token in tokenize(text):
+                scores[token] = scores.get(token, 0) + SEARCH_WEIGHTS[field]
+        for token, score in scores.items():
+            self._postings[token][recipe_id] = score
+        self._documents[recipe_id] = set(scores)
+        self._tokens = None
+
+    def rebuild(self):
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        for recipe_id, fields in self.documents():
+            self.add(recipe_id, fields)
+
+    def apply(self, recipe_ids):
+        documents = dict(self.documents(recipe_ids))
+        for recipe_id in recipe_ids:
+            self.remove(recipe_id)
+            if recipe_id in documents:
+                self.add(recipe_id, documents[recipe_id])
+
+    def load(self):
+        with self._lock:
+            self.ensure_loaded()
+            if self._tokens is None:
+                self._tokens = sorted(self._postings)
+            return self._tokens, self._postings
+
+    def search(self, query, limit):
+        """Все слова запроса должны встретиться хотя бы как префикс."""
+        tokens, postings = self.load()
+        scores = None
+        for word in set(tokenize(query)):
+            matches = {}
+            position = bisect.bisect_left(tokens, word)
+            while (position < len(tokens)
+                   and tokens[position].startswith(word)):
+                for recipe_id, score in postings[tokens[position]].items():
+                    matches[recipe_id] = max(matches.get(recipe_id, 0), score)
+                position += 1
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    recipe_id: score + matches[recipe_id]
+                    for recipe_id, score in scores.items()
+                    if recipe_id in matches
+                }
+        if not scores:
+            return []
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (-item[1], -item[0]),
+        )
+        return [recipe_id for recipe_id, _ in ranked[:limit]]
+
+
+recipe_search_index = RecipeSearchIndex()
+
+
+def add_to_counter(slices, bits):
+    """Побитовый сумматор: slices[i] хранит i-й разряд счётчика слотов."""
+    position = 0
+    while bits:
+        if position == len(slices):
+            slices.append(bits)
+            return
+        current = slices[position]
+        slices[position], bits = current ^ bits, current & bits
+        position += 1
+
+
+def counter_equals(slices, value, candidates):
+    """Слоты из candidates, в которых счётчик равен value."""
+    if value >> len(slices):
+        return 0
+    for position, bits in enumerate(slices):
+        candidates &= bits if value >> position & 1 else ~bits
+    return candidates
+
+
+class PantryIndex(IncrementalIndex):
+    """Рецепты по набору имеющихся ингредиентов."""
+    version_key = 'recipes:pantry-index:version'
+
+    def __init__(self):
+        super().__init__()
+        self._ingredient_bits = {}
+        self._required_bits = {}
+        self._recipe_ingredients = {}
+        self._recipe_slots = {}
+        self._slot_recipes = []
+
+    def lines(self, recipe_ids=None):
+        lines = RecipeIngredient.objects.order_by('recipe_id')
+        if recipe_ids is not None:
+            lines = lines.filter(recipe_id__in=recipe_ids)
+        recipes = defaultdict(set)
+        for recipe_id, ingredient_id in lines.values_list(
+            'recipe_id',
+            'ingredients_id',
+        ).iterator():
+            recipes[recipe_id].add(ingredient_id)
+        return recipes
+
+    def rebuild(self):
+        recipes = self.lines()
+        self._slot_recipes = sorted(recipes)
+        self._recipe_slots = {
+            recipe_id: slot
+            for slot, recipe_id in enumerate(self._slot_recipes)
+        }
+        self._recipe_ingredients = recipes
+        width = len(self._slot_recipes) // 8 + 1
+        ingredient_masks = defaultdict(lambda: bytearray(width))
+        required_masks = defaultdict(lambda: bytearray(width))
+        for recipe_id, ingredient_ids in recipes.items():
+            slot = self._recipe_slots[recipe_id]
+            required_masks[len(ingredient_ids)][slot >> 3] |= 1 << (slot & 7)
+            for ingredient_id in ingredient_ids:
+                ingredient_masks[ingredient_id][slot >> 3] |= 1 << (slot & 7)
+        self._ingredient_bits = {
+            ingredient_id: int.from_bytes(mask, 'little')
+            for ingredient_id, mask in ingredient_masks.items()
+        }
+        self._required_bits = {
+            required: int.from_bytes(mask, 'little')
+            for required, mask in required_masks.items()
+        }
+
+    def toggle(self, masks, key, bit):
+        bits = masks.get(key, 0) ^ bit
+        if bits:
+            masks[key] = bits
+        else:
+            masks.pop(key, None)
+
+    def apply(self, recipe_ids):
+        recipes = self.lines(recipe_ids)
+        for recipe_id in sorted(recipe_ids):
+            old = self._recipe_ingredients.pop(recipe_id, set())
+            new = recipes.get(recipe_id, set())
+            slot = self._recipe_slots.get(recipe_id)
+            if slot is None:
+                if not new:
+                    continue
+                slot = self._recipe_slots[recipe_id] = len(self._slot_recipes)
+                self._slot_recipes.append(recipe_id)
+            bit = 1 << slot
+            for ingredient_id in old ^ new:
+                self.toggle(self._ingredient_bits, ingredient_id, bit)
+            if len(old) != len(new):
+                if old:
+                    self.toggle(self._required_bits, len(old), bit)
+                if new:
+                    self.toggle(self._required_bits, len(new), bit)
+            if new:
+                self._recipe_ingredients[recipe_id] = new
+
+    def search(self, ingredient_ids, limit):
+        """Тройки (id рецепта, совпало строк, всего строк), лучшие первыми."""
+        with self._lock:
+            self.ensure_loaded()
+            slices = []
+            candidates = 0
+            for ingredient_id in set(ingredient_ids):
+                bits = self._ingredient_bits.get(ingredient_id, 0)
+                candidates |= bits
+                add_to_counter(slices, bits)
+            groups = []
+            for matched in range(1, len(set(ingredient_ids)) + 1):
+                matched_bits = counter_equals(slices, matched, candidates)
+                if not matched_bits:
+                    continue
+                for required, required_bits in self._required_bits.items():
+                    bits = matched_bits & required_bits
+                    if bits:
+                        groups.append((matched / required, matched, required,
+                                       bits))
+            groups.sort(key=lambda group: group[:3], reverse=True)
+            results = []
+            for _, matched, required, bits in groups:
+                while bits and len(results) < limit:
+                    slot = bits.bit_length() - 1
+                    bits ^= 1 << slot
+                    results.append(
+                        (self._slot_recipes[slot], matched, required)
+                    )
+                if len(results) == limit:
+                    break
+            return results
+
+
+pantry_index = PantryIndex()
+
+
+def update_search_vectors(recipe_ids, using='default'):
+    sql = SEARCH_VECTOR_SQL.format(
+        recipe=Recipe._meta.db_table,
+        recipe_ingredient=RecipeIngredient._meta.db_table,
+        ingredient=Ingredient._meta.db_table,
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [SEARCH_CONFIG] * 3 + [list(recipe_ids)])
+
+
+def reindex_recipes(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if connections['default'].vendor == 'postgresql':
+        update_search_vectors(recipe_ids)
+    else:
+        recipe_search_index.update(recipe_ids)
+    pantry_index.update(recipe_ids)
+
+
+_pending = threading.local()
+
+
+def schedule_reindex(recipe_ids):
+    """Копит id рецептов до фиксации транзакции и обновляет индексы разом."""
+    connection = transaction.get_connection()
+    pending = getattr(_pending, 'reindex', None)
+    if pending is not None and any(
+        callback is pending[0] for _, callback in connection.run_on_commit
+    ):
+        pending[1].update(recipe_ids)
+        return
+    recipe_ids = set(recipe_ids)
+
+    def flush():
+        _pending.reindex = None
+        reindex_recipes(recipe_ids)
+
+    _pending.reindex = (flush, recipe_ids)
+    transaction.on_commit(flush)
+
+
+def search_recipes(queryset, query, limit):
+    """Фильтрует рецепты по запросу и сортирует по релевантности."""
+    if connections[queryset.db].vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return queryset.annotate(
+            search_rank=SearchRank(F('search_vector'), search_query),
+        ).filter(search_vector=search_query).order_by('-search_rank', '-id')
+    recipe_ids = recipe_search_index.search(query, limit)
+    if not recipe_ids:
+        return queryset.none()
+    return queryset.filter(id__in=recipe_ids).order_by(Case(
+        *(
+            When(id=recipe_id, then=position)
+            for position, recipe_id in enumerate(recipe_ids)
+        ),
+        output_field=IntegerField(),
+    ))
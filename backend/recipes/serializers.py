@@ -1,10 +1,12 @@
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 
-from users.serializers import UserSerializer
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+from users.serializers import SubscriptionListSerializer, UserSerializer
+from .images import (StreamingBase64ImageField, rendition_url,
+                     rendition_urls, schedule_renditions)
+from .models import (Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+                     ShoppingCartTotal, Tag)
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -45,7 +47,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
-    id = serializers.IntegerField(source='ingredients.id')
+    id = serializers.IntegerField(source='ingredients_id')
 
     class Meta:
         model = RecipeIngredient
@@ -55,6 +57,43 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
         )
 
 
+class ThumbnailsField(serializers.Field):
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.renditions_ready:
+            return None
+        return rendition_urls(recipe, self.context.get('request'))
+
+
+class RecipeImageField(serializers.Field):
+    """Миниатюра нужного размера вместо оригинала."""
+
+    def __init__(self, size, image_format='jpeg', original_on_detail=False,
+                 **kwargs):
+        self.size = size
+        self.image_format = image_format
+        self.original_on_detail = original_on_detail
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        in_list = isinstance(self.parent.parent, serializers.ListSerializer)
+        if self.original_on_detail and not in_list:
+            url = recipe.image.url
+            return request.build_absolute_uri(url) if request else url
+        return rendition_url(recipe, self.size, self.image_format, request)
+
+
+class RecipeListSerializer(SubscriptionListSerializer):
+    author_attribute = 'author_id'
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializer(
         many=True,
@@ -64,10 +103,11 @@ class RecipeSerializer(serializers.ModelSerializer):
         read_only=True,
         many=True,
     )
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
     author = UserSerializer(read_only=True)
-    image = Base64ImageField(max_length=None)
+    image = RecipeImageField(size='medium', original_on_detail=True)
+    thumbnails = ThumbnailsField()
 
     class Meta:
         model = Recipe
@@ -79,6 +119,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'cooking_time',
             'tags',
             'image',
+            'thumbnails',
             'is_in_shopping_cart',
             'is_favorited',
             'author',
@@ -87,22 +128,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'id',
             'author',
         )
-
-    def get_is_favorited(self, recipe):
-        user = self.context.get('request').user
-        if user.is_authenticated and Favorite.objects.filter(user=user,
-                                                             recipe=recipe
-                                                             ).exists():
-            return True
-        return False
-
-    def get_is_in_shopping_cart(self, recipe):
-        user = self.context.get('request').user
-        if (user.is_authenticated
-            and ShoppingCart.objects.filter(user=user,
-                                            recipe=recipe).exists()):
-            return True
-        return False
+        list_serializer_class = RecipeListSerializer
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
@@ -114,7 +140,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         source='ingredients_recipe',
         many=True,
     )
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
+    thumbnails = ThumbnailsField()
 
     class Meta:
         model = Recipe
@@ -125,7 +152,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             'ingredients',
             'cooking_time',
             'tags',
-            'image'
+            'image',
+            'thumbnails',
         )
 
     def validate_name(self, name):
@@ -146,15 +174,13 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     def validate_ingredients(self, ingredients):
         if not ingredients:
             raise serializers.ValidationError('Из чего готовим?')
-        unique_check = list()
-        for ingredient in ingredients:
-            ingredient_id = ingredient.get('ingredients').get('id')
-            if ((ingredient_id not in unique_check)
-                and get_object_or_404(Ingredient,
-                                      id=ingredient_id)):
-                unique_check.append(ingredient_id)
-            else:
-                raise serializers.ValidationError('Проверьте id ингредиентов')
+        ingredient_ids = {
+            ingredient['ingredients_id'] for ingredient in ingredients
+        }
+        if ((len(ingredient_ids) != len(ingredients))
+            or (Ingredient.objects.filter(id__in=ingredient_ids).count()
+                != len(ingredient_ids))):
+            raise serializers.ValidationError('Проверьте id ингредиентов')
         return ingredients
 
     def validate_cooking_time(self, cooking_time):
@@ -162,34 +188,81 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Время - деньги!')
         return cooking_time
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
     def create_link_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            RecipeIngredient.objects.create(
-                recipe=recipe,
-                ingredients_id=ingredient.get('ingredients').get('id'),
-                amount=ingredient.get('amount'),
-            )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, **ingredient)
+            for ingredient in ingredients
+        )
+
+    def update_link_ingredients(self, ingredients, recipe):
+        amounts = {
+            ingredient['ingredients_id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        deltas = dict(amounts)
+        removed = []
+        changed = []
+        for line in recipe.ingredients_recipe.all():
+            amount = amounts.pop(line.ingredients_id, None)
+            deltas[line.ingredients_id] = (amount or 0) - line.amount
+            if amount is None:
+                removed.append(line.id)
+            elif amount != line.amount:
+                line.amount = amount
+                changed.append(line)
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        self.create_link_ingredients(
+            [
+                {'ingredients_id': ingredient_id, 'amount': amount}
+                for ingredient_id, amount in amounts.items()
+            ],
+            recipe,
+        )
+        ShoppingCartTotal.objects.apply(
+            list(ShoppingCart.objects.filter(recipe=recipe).values_list(
+                'user_id',
+                flat=True,
+            )),
+            deltas,
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients_recipe')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         self.create_link_ingredients(ingredients, recipe)
         recipe.tags.set(tags)
+        schedule_renditions(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
         ingredients = validated_data.pop('ingredients_recipe')
         tags = validated_data.pop('tags')
+        if 'image' in validated_data:
+            validated_data['renditions_ready'] = False
         recipe = super().update(recipe, validated_data)
-        recipe.ingredients.clear()
-        self.create_link_ingredients(ingredients, recipe)
+        self.update_link_ingredients(ingredients, recipe)
         recipe.tags.set(tags)
+        if 'image' in validated_data:
+            schedule_renditions(recipe)
         return recipe
 
 
 class TargetSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = RecipeImageField(size='small')
 
     class Meta:
         model = Recipe
@@ -200,3 +273,17 @@ class TargetSerializer(serializers.ModelSerializer):
             'image',
             'cooking_time',
         )
+
+
+class BatchSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=('add', 'remove', 'clear'))
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=settings.RECIPE_BATCH_MAX_SIZE,
+    )
+
+    def validate(self, data):
+        if data['action'] != 'clear' and not data.get('ids'):
+            raise serializers.ValidationError({'ids': 'Какие рецепты?'})
+        return data
@@ -0,0 +1,113 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import Follow, User
+from users.paginations import invalidate_counts
+from .caching import invalidate
+from .feed import backfill, fan_out, trim
+from .models import (Ingredient, Recipe, RecipeIngredient, ShoppingCartTotal,
+                     Tag)
+from .search import ingredient_index, schedule_reindex
+
+
+def invalidate_recipes(recipe_ids):
+    invalidate(
+        'recipes',
+        *(f'recipes:{recipe_id}' for recipe_id in recipe_ids),
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_cart_totals(sender, instance, **kwargs):
+    ShoppingCartTotal.objects.apply(
+        list(instance.shopping_cart.values_list('user_id', flat=True)),
+        ShoppingCartTotal.objects.recipe_amounts(instance.id, sign=-1),
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, created=True, **kwargs):
+    if created:
+        invalidate_counts('recipes')
+    invalidate_recipes([instance.id])
+    schedule_reindex([instance.id])
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        fan_out(instance)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    invalidate_counts('recipes')
+    if not reverse:
+        invalidate_recipes([instance.id])
+    elif action == 'pre_clear':
+        invalidate_recipes(instance.recipes.values_list('id', flat=True))
+    else:
+        invalidate_recipes(pk_set)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+    schedule_reindex([instance.recipe_id])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def invalidate_tag(sender, instance, **kwargs):
+    invalidate('tags', f'tags:{instance.id}')
+    invalidate_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def invalidate_ingredient(sender, instance, **kwargs):
+    invalidate('ingredients', f'ingredients:{instance.id}')
+    recipe_ids = list(
+        instance.ingredients_recipe.values_list('recipe_id', flat=True)
+    )
+    invalidate_recipes(recipe_ids)
+    schedule_reindex(recipe_ids)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    # Автор входит в ответ рецепта, поэтому сдвигается и Last-Modified.
+    instance.recipes.update(updated_at=timezone.now())
+    invalidate_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follower_state(sender, instance, **kwargs):
+    invalidate(f'user-state:{instance.user_id}')
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    trim(instance.user_id, instance.author_id)
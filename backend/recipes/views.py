@@ -1,43 +1,123 @@
-from django.db.models import Sum
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.db.models.functions import Coalesce, Greatest
+from django.core.files.storage import default_storage
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
-from users.paginations import LimitPagination
-from .filters import IngredientFilter, RecipeFilter
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+from users.paginations import (CachedCountPagination, LimitCursorPagination,
+                               LimitPagination)
+from .caching import CachedResponseMixin, ConditionalGetMixin, invalidate
+from .feed import feed_page
+from .filters import RecipeFilter
+from .images import RENDITION_FORMATS, RENDITION_SIZES, ensure_rendition
+from .models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                     ShoppingCartTotal, Tag)
 from .permissions import IsAuthor, IsReadOnly
-from .serializers import (IngredientSerializer, RecipeCreateSerializer,
-                          RecipeSerializer, TagSerializer, TargetSerializer)
+from .renderers import SHOPPING_LIST_RENDERERS
+from .search import ingredient_index, pantry_index
+from .serializers import (BatchSerializer, IngredientSerializer,
+                          RecipeCreateSerializer, RecipeSerializer,
+                          TagSerializer, TargetSerializer)
+
 
+class LastModifiedMixin:
+    def get_last_modified(self, request):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg not in self.kwargs:
+            return None
+        return self.queryset.model.objects.filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        ).values_list('updated_at', flat=True).first()
 
-class TagViewSet(viewsets.ModelViewSet):
+
+class TagViewSet(LastModifiedMixin, ConditionalGetMixin, CachedResponseMixin,
+                 viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
+    response_cache_tag = 'tags'
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(LastModifiedMixin, ConditionalGetMixin,
+                        CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (IngredientFilter,)
     permission_classes = [AllowAny]
-    search_fields = ('^name',)
+    response_cache_tag = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        ingredients = ingredient_index.search(
+            name,
+            settings.INGREDIENT_AUTOCOMPLETE_LIMIT,
+        )
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, CachedResponseMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.order_by('-id')
     permission_classes = (IsReadOnly | IsAuthor,)
-    pagination_class = LimitPagination
+    pagination_class = CachedCountPagination
+    count_cache_scope = 'recipes'
+    response_cache_tag = 'recipes'
     filter_backends = [DjangoFilterBackend]
     filter_class = RecipeFilter
     lookup_field = 'id'
 
+    @property
+    def paginator(self):
+        # Курсор по изменчивому favorites_count вырождается в OFFSET и
+        # теряет строки, поэтому popular всегда листается страницами.
+        params = self.request.query_params
+        if (
+            params.get('pagination') == 'cursor'
+            and params.get('ordering') != 'popular'
+        ):
+            self.pagination_class = LimitCursorPagination
+        return super().paginator
+
+    def get_response_cache_tags(self):
+        tags = super().get_response_cache_tags()
+        if self.request.query_params.get('ordering') == 'popular':
+            tags.append('recipes-popular')
+        return tags
+
+    def invalidate_links(self, counter):
+        tags = [f'user-state:{self.request.user.id}']
+        if counter == 'favorites_count':
+            tags.append('recipes-popular')
+        invalidate(*tags)
+
+    def get_queryset(self):
+        return super().get_queryset().with_related_for(self.request.user)
+
+    def get_last_modified(self, request):
+        if 'id' not in self.kwargs:
+            return None
+        return Recipe.objects.filter(id=self.kwargs['id']).annotate(
+            last_modified=Greatest(
+                'updated_at',
+                Coalesce(Max('tags__updated_at'), 'updated_at'),
+                Coalesce(Max('ingredients__updated_at'), 'updated_at'),
+            ),
+        ).values_list('last_modified', flat=True).first()
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeSerializer
@@ -46,34 +126,39 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    def processing_item(self, request, id, obj):
-        item = obj.objects.filter(
-            user=request.user,
-            recipe__id=id,
-        )
+    def processing_item(self, request, id, obj, counter):
         msg = ('Только POST запрос на существующий,',
                'DELETE на несуществующий рецепт')
-        if (request.method == 'POST') and (not item.exists()):
+        if request.method == 'POST':
+            added = obj.objects.add_many(request.user, [int(id)])
             recipe = get_object_or_404(
                 Recipe,
                 id=id,
             )
-            obj.objects.create(
-                user=request.user,
-                recipe=recipe,
+            if not added:
+                return Response(
+                    {'errors': msg},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            Recipe.objects.filter(id=recipe.id).update(
+                **{counter: F(counter) + 1},
             )
+            self.invalidate_links(counter)
             serializer = TargetSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        elif (request.method == 'DELETE') and (item.exists()):
-            item.delete()
-            msg = 'Удалено'
+        if not obj.objects.remove_many(request.user, [int(id)]):
             return Response(
-                {'Confirmation': msg},
-                status=status.HTTP_204_NO_CONTENT
+                {'errors': msg},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+        Recipe.objects.filter(id=id, **{f'{counter}__gt': 0}).update(
+            **{counter: F(counter) - 1},
+        )
+        self.invalidate_links(counter)
+        msg = 'Удалено'
         return Response(
-            {'errors': msg},
-            status=status.HTTP_400_BAD_REQUEST,
+            {'Confirmation': msg},
+            status=status.HTTP_204_NO_CONTENT
         )
 
     @action(
@@ -81,11 +166,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=['POST', 'DELETE'],
         permission_classes=[IsAuthenticated],
     )
+    @transaction.atomic
     def favorite(self, request, id=None):
         response = self.processing_item(
             request=request,
             id=id,
             obj=Favorite,
+            counter='favorites_count',
         )
         return response
 
@@ -94,31 +181,252 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=['POST', 'DELETE'],
         permission_classes=[IsAuthenticated],
     )
+    @transaction.atomic
     def shopping_cart(self, request, id=None):
         response = self.processing_item(
             request=request,
             id=id,
             obj=ShoppingCart,
+            counter='shopping_cart_count',
         )
+        if response.status_code == status.HTTP_201_CREATED:
+            ShoppingCartTotal.objects.add_recipe(request.user, id)
+        elif response.status_code == status.HTTP_204_NO_CONTENT:
+            ShoppingCartTotal.objects.remove_recipe(request.user, id)
+        return response
+
+    def processing_batch(self, request, obj, counter):
+        """Применяет add/remove/clear к списку рецептов за одну транзакцию."""
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        batch_action = serializer.validated_data['action']
+        ids = list(dict.fromkeys(serializer.validated_data.get('ids', ())))
+        added, removed = set(), set()
+        if batch_action == 'clear':
+            removed = obj.objects.remove_many(request.user)
+            ids = sorted(removed)
+            statuses = ((removed, 'removed'),)
+        elif batch_action == 'add':
+            added = obj.objects.add_many(request.user, ids)
+            found = set(Recipe.objects.filter(id__in=ids).values_list(
+                'id',
+                flat=True,
+            ))
+            statuses = (
+                (added, 'added'),
+                (found, 'already_added'),
+            )
+        else:
+            removed = obj.objects.remove_many(request.user, ids)
+            statuses = ((removed, 'removed'),)
+        results = {
+            recipe_id: next(
+                (result for group, result in statuses if recipe_id in group),
+                'not_found' if batch_action == 'add' else 'not_in_list',
+            )
+            for recipe_id in ids
+        }
+        if added:
+            Recipe.objects.filter(id__in=added).update(
+                **{counter: F(counter) + 1},
+            )
+        if removed:
+            Recipe.objects.filter(
+                id__in=removed,
+                **{f'{counter}__gt': 0},
+            ).update(**{counter: F(counter) - 1})
+        if added or removed:
+            self.invalidate_links(counter)
+        response = Response({
+            'action': batch_action,
+            'results': [
+                {'id': recipe_id, 'result': result}
+                for recipe_id, result in results.items()
+            ],
+        })
+        return response, added, removed
+
+    @action(
+        detail=False,
+        methods=['POST'],
+        permission_classes=[IsAuthenticated],
+        url_path='favorite/batch',
+    )
+    @transaction.atomic
+    def favorite_batch(self, request):
+        response, _, _ = self.processing_batch(
+            request=request,
+            obj=Favorite,
+            counter='favorites_count',
+        )
+        return response
+
+    @action(
+        detail=False,
+        methods=['POST'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart/batch',
+    )
+    @transaction.atomic
+    def shopping_cart_batch(self, request):
+        response, added, removed = self.processing_batch(
+            request=request,
+            obj=ShoppingCart,
+            counter='shopping_cart_count',
+        )
+        if added or removed:
+            ShoppingCartTotal.objects.apply(
+                [request.user.id],
+                ShoppingCartTotal.objects.recipes_amounts(
+                    added or removed,
+                    sign=1 if added else -1,
+                ),
+            )
         return response
 
     @action(detail=False, methods=['GET'],
             permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        try:
+            before = request.query_params.get('before')
+            before = int(before) if before else None
+            limit = min(
+                int(request.query_params.get(
+                    'limit',
+                    LimitPagination.page_size,
+                )),
+                settings.FEED_MAX_LIMIT,
+            )
+        except ValueError:
+            return Response(
+                {'errors': 'before и limit должны быть числами'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        recipe_ids = feed_page(request.user, before, max(limit, 1))
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        page = [recipes[recipe_id] for recipe_id in recipe_ids
+                if recipe_id in recipes]
+        next_url = None
+        if len(recipe_ids) == limit:
+            next_url = replace_query_param(
+                request.build_absolute_uri(),
+                'before',
+                recipe_ids[-1],
+            )
+        return Response({
+            'next': next_url,
+            'results': self.get_serializer(page, many=True).data,
+        })
+
+    @action(detail=False, methods=['GET'], permission_classes=[AllowAny])
+    def what_can_i_cook(self, request):
+        try:
+            ingredient_ids = {
+                int(ingredient_id)
+                for value in request.query_params.getlist('ingredients')
+                for ingredient_id in value.split(',')
+                if ingredient_id.strip()
+            }
+            limit = min(
+                int(request.query_params.get(
+                    'limit',
+                    settings.WHAT_CAN_I_COOK_LIMIT,
+                )),
+                settings.WHAT_CAN_I_COOK_MAX_LIMIT,
+            )
+        except ValueError:
+            return Response(
+                {'errors': 'ingredients и limit должны быть числами'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not ingredient_ids:
+            return Response(
+                {'errors': 'Укажите хотя бы один ингредиент'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(ingredient_ids) > settings.WHAT_CAN_I_COOK_MAX_INGREDIENTS:
+            return Response(
+                {'errors': 'Укажите не больше {} ингредиентов'.format(
+                    settings.WHAT_CAN_I_COOK_MAX_INGREDIENTS,
+                )},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if limit < 1:
+            return Response(
+                {'errors': 'limit должен быть больше нуля'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ranked = pantry_index.search(ingredient_ids, limit)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in ranked],
+        )
+        ranked = [item for item in ranked if item[0] in recipes]
+        data = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _, _ in ranked],
+            many=True,
+        ).data
+        for recipe, (_, matched, required) in zip(data, ranked):
+            recipe['matched_ingredients'] = matched
+            recipe['missing_ingredients'] = required - matched
+        return Response(data)
+
+    @action(
+        detail=True,
+        methods=['GET'],
+        permission_classes=[AllowAny],
+        url_path=(
+            r'image/(?P<size>{})/(?P<image_format>{})'.format(
+                '|'.join(RENDITION_SIZES),
+                '|'.join(RENDITION_FORMATS),
+            )
+        ),
+        url_name='image',
+    )
+    def image(self, request, id=None, size=None, image_format=None):
+        recipe = get_object_or_404(Recipe.objects.only('image'), id=id)
+        try:
+            name = ensure_rendition(
+                recipe.id,
+                recipe.image.name,
+                size,
+                image_format,
+            )
+        except OSError:
+            # Оригинал потерян или не читается как изображение.
+            raise Http404
+        return redirect(default_storage.url(name))
+
+    def shopping_cart_etag(self, products):
+        fingerprint = hashlib.md5(
+            self.request.accepted_renderer.format.encode(),
+        )
+        for product in products:
+            fingerprint.update(repr(product).encode())
+        return quote_etag(fingerprint.hexdigest())
+
+    @action(detail=False, methods=['GET'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredients__name',
-            'ingredients__measurement_unit'
-        ).annotate(total_amount=Sum('amount')).order_by()
-        products = [
-            (
-                f"{ingredient['ingredients__name']}\t --"
-                f" {ingredient['total_amount']}\t"
-                f"({ingredient['ingredients__measurement_unit']})\n"
-            )
-            for ingredient in ingredients]
-        response = HttpResponse(products, content_type='text/plain')
-        attachment = 'attachment; filename="products.txt"'
+        products = list(ShoppingCartTotal.objects.filter(
+            user=request.user,
+        ).values_list(
+            'ingredient_id',
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'total_amount',
+        ).order_by('ingredient__name', 'ingredient_id'))
+        etag = self.shopping_cart_etag(products)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(product[1:] for product in products),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        attachment = f'attachment; filename="products.{renderer.format}"'
         response['Content-Disposition'] = attachment
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept',))
         return response
@@ -0,0 +1,86 @@
+import pytest
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management import call_command
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+def authorized_client(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create(username='cook', email='cook@example.com')
+
+
+@pytest.fixture
+def author(db):
+    return User.objects.create(username='chef', email='chef@example.com')
+
+
+@pytest.fixture
+def user_client(user):
+    return authorized_client(user)
+
+
+@pytest.fixture
+def other_process_cache(db, settings):
+    """Общий кэш в базе и его экземпляр «другого процесса»."""
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    }}
+    call_command('createcachetable')
+    return DatabaseCache('django_cache', {})
+
+
+@pytest.fixture
+def make_recipes(db):
+    """Рецепты автора с тегами и строками ингредиентов."""
+
+    def make(author, count, lines=3):
+        tags = [
+            Tag.objects.get_or_create(slug=slug, defaults={
+                'name': slug, 'color': '#ffffff',
+            })[0]
+            for slug in ('breakfast', 'lunch')
+        ]
+        start = Ingredient.objects.count()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient {number}', measurement_unit='г')
+            for number in range(start, start + lines)
+        )
+        ingredients = list(Ingredient.objects.order_by('-id')[:lines])
+        recipes = []
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'recipe {number}',
+                text='text',
+                image='recipes/images/test.png',
+                cooking_time=10,
+            )
+            recipe.tags.set(tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredients=ingredient,
+                                 amount=number + 1)
+                for ingredient in ingredients
+            )
+            recipes.append(recipe)
+        return recipes
+
+    return make
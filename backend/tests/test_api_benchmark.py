@@ -0,0 +1,42 @@
+import json
+import os
+
+import pytest
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from recipes.benchmark import (API_ENDPOINTS, api_endpoint_context,
+                               generate_dataset)
+from recipes.management.commands.benchmark_api import Command
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'api_baseline.json')
+
+
+@pytest.fixture
+def endpoint_context(db):
+    generate_dataset(
+        recipes=60, users=20, ingredients=100, tags=5,
+        follows=5, favorites=5, cart=3, seed=0,
+    )
+    return api_endpoint_context()
+
+
+@pytest.mark.parametrize('name', sorted(API_ENDPOINTS))
+def test_endpoint_queries_within_baseline(endpoint_context, name):
+    """Число запросов эндпоинта не растёт относительно api_baseline.json."""
+    with open(BASELINE, encoding='utf-8') as file:
+        baseline = json.load(file)['endpoints']
+    authorized, path, params = API_ENDPOINTS[name]
+    headers = {}
+    if authorized:
+        token, _ = Token.objects.get_or_create(user=endpoint_context['user'])
+        headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+    result = Command().measure(
+        Client(HTTP_HOST='localhost'),
+        path.format(**endpoint_context),
+        params(endpoint_context),
+        headers,
+        {'warmup': 1, 'requests': 3, 'cold': False},
+    )
+    assert result['status'] == [200]
+    assert result['queries'] <= baseline[name]['queries'], result
@@ -0,0 +1,29 @@
+from recipes.models import Recipe, ShoppingCartTotal
+
+
+def counters():
+    return set(Recipe.objects.values_list('shopping_cart_count', flat=True))
+
+
+def test_shopping_cart_batch_keeps_counters(user, user_client, author,
+                                            make_recipes):
+    first, second = make_recipes(author, 2)
+    user_client.post(f'/api/recipes/{first.id}/shopping_cart/')
+    response = user_client.post('/api/recipes/shopping_cart/batch/', {
+        'action': 'add',
+        'ids': [first.id, second.id, 9999],
+    }, format='json')
+    assert response.data['results'] == [
+        {'id': first.id, 'result': 'already_added'},
+        {'id': second.id, 'result': 'added'},
+        {'id': 9999, 'result': 'not_found'},
+    ]
+    assert counters() == {1}
+
+    response = user_client.post('/api/recipes/shopping_cart/batch/', {
+        'action': 'clear',
+    }, format='json')
+    results = {item['result'] for item in response.data['results']}
+    assert results == {'removed'}
+    assert counters() == {0}
+    assert not ShoppingCartTotal.objects.filter(user=user).exists()
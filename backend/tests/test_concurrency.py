@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+import pytest
+from django.db import connections
+
+from recipes.models import Favorite, Recipe, ShoppingCartTotal
+from .conftest import authorized_client
+
+THREADS = 8
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def hammer(user, method, url):
+    """Отправляет один и тот же запрос из нескольких потоков сразу."""
+    barrier = Barrier(THREADS)
+
+    def send(_):
+        client = authorized_client(user)
+        barrier.wait()
+        try:
+            return getattr(client, method)(url).status_code
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        return sorted(executor.map(send, range(THREADS)))
+
+
+def test_concurrent_favorite_toggles(user, author, make_recipes):
+    recipe, = make_recipes(author, 1)
+    url = f'/api/recipes/{recipe.id}/favorite/'
+
+    statuses = hammer(user, 'post', url)
+    assert statuses == [201] + [400] * (THREADS - 1)
+    assert Favorite.objects.filter(user=user, recipe=recipe).count() == 1
+    assert Recipe.objects.get(id=recipe.id).favorites_count == 1
+
+    statuses = hammer(user, 'delete', url)
+    assert statuses == [204] + [400] * (THREADS - 1)
+    assert not Favorite.objects.filter(user=user, recipe=recipe).exists()
+    assert Recipe.objects.get(id=recipe.id).favorites_count == 0
+
+
+def test_concurrent_shopping_cart_toggles(user, author, make_recipes):
+    recipe, = make_recipes(author, 1)
+    url = f'/api/recipes/{recipe.id}/shopping_cart/'
+
+    statuses = hammer(user, 'post', url)
+    assert statuses == [201] + [400] * (THREADS - 1)
+    assert list(ShoppingCartTotal.objects.filter(user=user).values_list(
+        'total_amount',
+        flat=True,
+    )) == [1, 1, 1]
+
+    statuses = hammer(user, 'delete', url)
+    assert statuses == [204] + [400] * (THREADS - 1)
+    assert not ShoppingCartTotal.objects.filter(user=user).exists()
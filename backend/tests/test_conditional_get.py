@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.management.commands.load_ingredients import (
+    Command as LoadIngredients)
+from recipes.models import Ingredient, Recipe, Tag
+
+
+def test_missing_recipe_ignores_preconditions(db):
+    response = APIClient().get('/api/recipes/9999/', HTTP_IF_NONE_MATCH='*')
+    assert response.status_code == 404
+
+
+def test_loaded_ingredients_change_etag(db, tmp_path):
+    client = APIClient()
+    etag = client.get('/api/ingredients/')['ETag']
+    path = tmp_path / 'ingredients.csv'
+    path.write_text('соль,г\n', encoding='utf-8')
+    LoadIngredients().handle(path=str(path), format=None, batch_size=100)
+    response = client.get('/api/ingredients/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert len(response.data) == 1
+
+
+def test_author_rename_changes_last_modified(author, make_recipes):
+    recipe, = make_recipes(author, 1)
+    for model in (Recipe, Tag, Ingredient):
+        model.objects.update(updated_at=timezone.now() - timedelta(days=1))
+    client = APIClient()
+    last_modified = client.get(f'/api/recipes/{recipe.id}/')['Last-Modified']
+    author.username = 'renamed'
+    author.save()
+    response = client.get(
+        f'/api/recipes/{recipe.id}/',
+        HTTP_IF_MODIFIED_SINCE=last_modified,
+    )
+    assert response.status_code == 200
+    assert response.data['author']['username'] == 'renamed'
+
+
+def test_other_process_changes_etag(other_process_cache, monkeypatch,
+                                    tmp_path):
+    client = APIClient()
+    etag = client.get('/api/ingredients/')['ETag']
+    path = tmp_path / 'ingredients.csv'
+    path.write_text('соль,г\n', encoding='utf-8')
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            'recipes.caching.response_cache',
+            lambda: other_process_cache,
+        )
+        patch.setattr('recipes.search.cache', other_process_cache)
+        LoadIngredients().handle(path=str(path), format=None, batch_size=100)
+    response = client.get('/api/ingredients/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert len(response.data) == 1
@@ -0,0 +1,25 @@
+import pytest
+
+from foodgram.nplusone import NPlusOneError, detect_n_plus_one
+from recipes.models import RecipeIngredient
+# users.serializers первым: модули сериализаторов импортируют друг друга.
+from users.serializers import UserSerializer  # noqa: F401
+from recipes.serializers import RecipeIngredientSerializer
+
+
+def test_detector_reports_serializer_field(author, make_recipes):
+    make_recipes(author, 5, lines=1)
+    with pytest.raises(NPlusOneError, match='RecipeIngredientSerializer.id'):
+        with detect_n_plus_one():
+            RecipeIngredientSerializer(
+                RecipeIngredient.objects.all(),
+                many=True,
+            ).data
+
+
+def test_recipe_list_has_no_n_plus_one(user_client, author, make_recipes):
+    make_recipes(author, 50)
+    with detect_n_plus_one('RecipeViewSet.list') as detector:
+        response = user_client.get('/api/recipes/', {'limit': 50})
+    assert response.status_code == 200
+    assert detector.reports == []
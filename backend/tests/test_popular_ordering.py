@@ -0,0 +1,27 @@
+from rest_framework.test import APIClient
+
+
+def test_favorite_changes_popular_etag(user_client, author, make_recipes):
+    first, second = make_recipes(author, 2)
+    client = APIClient()
+    response = client.get('/api/recipes/', {'ordering': 'popular'})
+    assert response.data['results'][0]['id'] == second.id
+    user_client.post(f'/api/recipes/{first.id}/favorite/')
+    response = client.get(
+        '/api/recipes/',
+        {'ordering': 'popular'},
+        HTTP_IF_NONE_MATCH=response['ETag'],
+    )
+    assert response.status_code == 200
+    assert response.data['results'][0]['id'] == first.id
+
+
+def test_popular_ignores_cursor_pagination(author, make_recipes):
+    make_recipes(author, 3)
+    response = APIClient().get('/api/recipes/', {
+        'ordering': 'popular',
+        'pagination': 'cursor',
+        'limit': 2,
+    })
+    assert response.data['count'] == 3
+    assert 'page=2' in response.data['next']
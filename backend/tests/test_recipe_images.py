@@ -0,0 +1,6 @@
+def test_missing_original_has_no_rendition(user_client, author, make_recipes):
+    recipe, = make_recipes(author, 1)
+    response = user_client.get('/api/recipes/')
+    assert response.data['results'][0]['image'] is None
+    response = user_client.get(f'/api/recipes/{recipe.id}/image/small/webp/')
+    assert response.status_code == 404
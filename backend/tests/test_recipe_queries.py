@@ -0,0 +1,15 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@pytest.mark.parametrize('limit', [6, 50, 200])
+def test_recipe_page_runs_fixed_number_of_queries(
+    user_client, author, make_recipes, limit,
+):
+    make_recipes(author, limit)
+    with CaptureQueriesContext(connection) as context:
+        response = user_client.get('/api/recipes/', {'limit': limit})
+    assert response.status_code == 200
+    assert len(response.data['results']) == limit
+    assert len(context) == 6, [query['sql'] for query in context]
@@ -0,0 +1,53 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.search import pantry_index, recipe_search_index
+
+PNG = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+
+@pytest.fixture
+def loaded_indexes(db):
+    for index in (recipe_search_index, pantry_index):
+        index.invalidate()
+        with index._lock:
+            index.ensure_loaded()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_recipe_update_reindexes_once(
+    user, user_client, make_recipes, loaded_indexes, settings, tmp_path,
+):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.RECIPE_IMAGE_WORKERS = 0
+    recipe, = make_recipes(user, 1, lines=60)
+    lines = list(recipe.ingredients_recipe.all()[:30])
+    with CaptureQueriesContext(connection) as context:
+        response = user_client.put(f'/api/recipes/{recipe.id}/', {
+            'name': 'updated',
+            'text': 'text',
+            'cooking_time': 5,
+            'image': PNG,
+            'tags': list(recipe.tags.values_list('id', flat=True)),
+            'ingredients': [
+                {'id': line.ingredients_id, 'amount': line.amount}
+                for line in lines
+            ],
+        }, format='json')
+    assert response.status_code == 200, response.data
+    assert len(context) <= 20
+
+
+@pytest.mark.django_db(transaction=True)
+def test_recipe_delete_reindexes_once(
+    user, user_client, make_recipes, loaded_indexes,
+):
+    recipe, = make_recipes(user, 1, lines=60)
+    with CaptureQueriesContext(connection) as context:
+        response = user_client.delete(f'/api/recipes/{recipe.id}/')
+    assert response.status_code == 204
+    assert len(context) <= 18
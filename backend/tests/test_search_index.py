@@ -0,0 +1,15 @@
+from recipes.models import Ingredient
+from recipes.search import ingredient_index
+
+
+def test_other_process_reloads_index(other_process_cache, monkeypatch):
+    assert ingredient_index.search('соль', 10) == []
+    Ingredient.objects.bulk_create([
+        Ingredient(name='соль', measurement_unit='г'),
+    ])
+    with monkeypatch.context() as patch:
+        patch.setattr('recipes.search.cache', other_process_cache)
+        ingredient_index.invalidate()
+    assert [
+        ingredient.name for ingredient in ingredient_index.search('соль', 10)
+    ] == ['соль']
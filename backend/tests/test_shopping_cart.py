@@ -0,0 +1,34 @@
+from recipes.models import Ingredient, ShoppingCartTotal
+
+
+def test_download_etag_follows_cart_contents(user, user_client):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'ingredient {number}', measurement_unit='г')
+        for number in range(3)
+    )
+    ingredients = list(Ingredient.objects.order_by('id'))
+
+    def fill(amounts):
+        ShoppingCartTotal.objects.filter(user=user).delete()
+        ShoppingCartTotal.objects.bulk_create(
+            ShoppingCartTotal(user=user, ingredient=ingredient,
+                              total_amount=amount)
+            for ingredient, amount in zip(ingredients, amounts)
+        )
+
+    def download(etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return user_client.get('/api/recipes/download_shopping_cart/',
+                               **headers)
+
+    fill((1, 3, 1))
+    etag = download()['ETag']
+    fill((2, 1, 2))
+    response = download(etag)
+    assert response.status_code == 200
+    etag = response['ETag']
+    Ingredient.objects.filter(id=ingredients[0].id).update(name='соль')
+    response = download(etag)
+    assert response.status_code == 200
+    assert 'соль' in b''.join(response.streaming_content).decode()
+    assert download(response['ETag']).status_code == 304
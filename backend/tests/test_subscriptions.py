@@ -0,0 +1,24 @@
+import pytest
+
+from users.models import Follow
+
+
+@pytest.mark.parametrize('recipes_limit', ['abc', '0', '-1'])
+def test_invalid_recipes_limit(user, user_client, author, recipes_limit):
+    Follow.objects.create(user=user, author=author)
+    response = user_client.get(
+        '/api/users/subscriptions/',
+        {'recipes_limit': recipes_limit},
+    )
+    assert response.status_code == 400
+
+
+def test_recipes_limit(user, user_client, author, make_recipes):
+    make_recipes(author, 3)
+    Follow.objects.create(user=user, author=author)
+    response = user_client.get(
+        '/api/users/subscriptions/',
+        {'recipes_limit': 2},
+    )
+    assert response.status_code == 200
+    assert len(response.data['results'][0]['recipes']) == 2
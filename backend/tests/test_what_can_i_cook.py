@@ -0,0 +1,18 @@
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+URL = '/api/recipes/what_can_i_cook/'
+
+
+def test_limit_error_names_limit(db):
+    response = APIClient().get(URL, {'ingredients': '1,2', 'limit': 0})
+    assert response.status_code == 400
+    assert 'limit' in response.data['errors']
+
+
+@override_settings(WHAT_CAN_I_COOK_MAX_INGREDIENTS=3)
+def test_too_many_ingredients(db):
+    response = APIClient().get(URL, {'ingredients': '1,2,3,4'})
+    assert response.status_code == 400
+    response = APIClient().get(URL, {'ingredients': '1,2,3'})
+    assert response.status_code == 200
@@ -26,10 +26,12 @@ class Follow(models.Model):
                                related_name='following')
 
     class Meta:
-        ordering = ('-user',)
         constraints = [models.UniqueConstraint(
             fields=['user', 'author'],
             name='uniques')]
+        indexes = [models.Index(
+            fields=['author', 'user'],
+            name='follow_author_user')]
 
     def __str__(self):
         return f'{self.user} -> {self.author}'
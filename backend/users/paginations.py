@@ -1,6 +1,115 @@
-from rest_framework.pagination import PageNumberPagination
+import uuid
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+def count_cache_version(scope):
+    key = f'counts:{scope}:version'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_counts(*scopes):
+    cache.set_many(
+        {f'counts:{scope}:version': uuid.uuid4().hex for scope in scopes},
+        None,
+    )
+
+
+class CachedCountPaginator(Paginator):
+    def __init__(self, *args, count_key=None, count_timeout=None,
+                 estimate_threshold=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_key = count_key
+        self.count_timeout = count_timeout
+        self.estimate_threshold = estimate_threshold
+
+    def estimate_count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < self.estimate_threshold:
+            return None
+        return row[0]
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return super().count
+        count = cache.get(self.count_key)
+        if count is None:
+            if self.estimate_threshold is not None:
+                count = self.estimate_count()
+            if count is None:
+                count = super().count
+            cache.set(self.count_key, count, self.count_timeout)
+        return count
 
 
 class LimitPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class CachedCountPagination(LimitPagination):
+    """Кэширует count для списков без фильтров или только с тегами."""
+    count_cache_timeout = 60
+    count_cache_params = ('tags', 'ordering')
+    estimate_threshold = 100000
+
+    def get_count_params(self, request):
+        return sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+            if key not in (self.page_query_param, self.page_size_query_param)
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_key = None
+        self.use_estimate = False
+        scope = getattr(view, 'count_cache_scope', None)
+        params = self.get_count_params(request)
+        if scope is not None and all(
+            key in self.count_cache_params for key, _ in params
+        ):
+            parts = ['counts', scope, count_cache_version(scope)]
+            if getattr(view, 'count_cache_per_user', False):
+                parts.append(str(request.user.id))
+            else:
+                self.use_estimate = not params
+            parts.append(urlencode(params, doseq=True))
+            self.count_key = ':'.join(parts)
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, *args, **kwargs):
+        return CachedCountPaginator(
+            *args,
+            count_key=self.count_key,
+            count_timeout=self.count_cache_timeout,
+            estimate_threshold=(
+                self.estimate_threshold if self.use_estimate else None
+            ),
+            **kwargs,
+        )
+
+
+class LimitCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
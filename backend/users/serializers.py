@@ -1,6 +1,18 @@
 from rest_framework import serializers
 
-from .models import Follow, User
+from .models import User
+from .subscriptions import SubscriptionResolver
+
+
+class SubscriptionListSerializer(serializers.ListSerializer):
+    author_attribute = 'id'
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        SubscriptionResolver.for_request(self.context['request']).prime(
+            getattr(item, self.author_attribute) for item in items
+        )
+        return super().to_representation(items)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -20,6 +32,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
         model = User
         extra_kwargs = {"password": {"write_only": True}}
+        list_serializer_class = SubscriptionListSerializer
 
     def create(self, validated_data):
         password = validated_data.pop('password')
@@ -29,11 +42,9 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
     def get_is_subscribed(self, author):
-        user = self.context.get('request').user
-        return not user.is_anonymous and Follow.objects.filter(
-            user=user,
-            author=author.id
-        ).exists()
+        return SubscriptionResolver.for_request(
+            self.context['request']
+        ).is_subscribed(author.id)
 
 
 from recipes.serializers import TargetSerializer
@@ -41,7 +52,7 @@ from recipes.serializers import TargetSerializer
 
 class FollowSerializer(serializers.ModelSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -56,22 +67,12 @@ class FollowSerializer(serializers.ModelSerializer):
             'recipes',
             'recipes_count'
         )
+        list_serializer_class = SubscriptionListSerializer
 
-    def get_recipes_count(self, author):
-        return author.recipes.count()
+    def get_is_subscribed(self, author):
+        return SubscriptionResolver.for_request(
+            self.context['request']
+        ).is_subscribed(author.id)
 
     def get_recipes(self, author):
-        recipes = author.recipes.all()
-        recipes_limit = self.context.get('request').query_params.get(
-            'recipes_limit',
-        )
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
-        return TargetSerializer(recipes, many=True).data
-
-    def get_is_subscribed(self, author):
-        user = self.context.get('request').user
-        return not user.is_anonymous and Follow.objects.filter(
-            user=user,
-            author=author.id
-        ).exists()
+        return TargetSerializer(author.limited_recipes, many=True).data
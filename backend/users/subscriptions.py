@@ -0,0 +1,41 @@
+from .models import Follow
+
+
+class SubscriptionResolver:
+    """Подписки текущего пользователя, общие для всего запроса."""
+
+    def __init__(self, user):
+        self.user = user
+        self.subscriptions = {}
+
+    @classmethod
+    def for_request(cls, request):
+        resolver = getattr(request, '_subscription_resolver', None)
+        if resolver is None:
+            resolver = cls(request.user)
+            request._subscription_resolver = resolver
+        return resolver
+
+    def prime(self, author_ids):
+        missing = set(author_ids) - self.subscriptions.keys()
+        if not missing:
+            return
+        if self.user.is_anonymous:
+            followed = set()
+        else:
+            followed = set(Follow.objects.filter(
+                user=self.user,
+                author_id__in=missing,
+            ).values_list('author_id', flat=True))
+        self.subscriptions.update(
+            (author_id, author_id in followed) for author_id in missing
+        )
+
+    def mark(self, author_ids, subscribed):
+        self.subscriptions.update(
+            (author_id, subscribed) for author_id in author_ids
+        )
+
+    def is_subscribed(self, author_id):
+        self.prime([author_id])
+        return self.subscriptions[author_id]
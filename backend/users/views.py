@@ -1,18 +1,24 @@
+from django.db.models import Count, Prefetch
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from recipes.models import Recipe, Tag
 from .models import Follow, User
-from .paginations import LimitPagination
+from .paginations import CachedCountPagination
 from .serializers import FollowSerializer, UserSerializer
+from .subscriptions import SubscriptionResolver
 
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
+    pagination_class = CachedCountPagination
+    count_cache_scope = 'users'
     lookup_field = 'id'
 
     @action(detail=False, methods=['GET'],
@@ -37,6 +43,7 @@ class UserViewSet(viewsets.ModelViewSet):
                                 status=status.HTTP_400_BAD_REQUEST)
 
             Follow.objects.create(user=user, author=author)
+            SubscriptionResolver.for_request(request).mark([author.id], True)
             data = UserSerializer(
                 author,
                 context={'request': request}).data
@@ -49,7 +56,40 @@ class UserViewSet(viewsets.ModelViewSet):
 class SubscriptionListView(generics.ListAPIView):
     serializer_class = FollowSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = LimitPagination
+    pagination_class = CachedCountPagination
+    count_cache_scope = 'follow'
+    count_cache_per_user = True
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user)
+        user = self.request.user
+        recipes = Recipe.objects.filter(author__following__user=user)
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit:
+            try:
+                recipes_limit = int(recipes_limit)
+            except ValueError:
+                recipes_limit = 0
+            if recipes_limit < 1:
+                raise ValidationError(
+                    {'errors': 'recipes_limit должно быть натуральным числом'}
+                )
+            recipes = recipes.limit_per_author(recipes_limit)
+        return User.objects.filter(following__user=user).annotate(
+            recipes_count=Count('recipes'),
+        ).prefetch_related(Prefetch(
+            'recipes',
+            queryset=recipes.prefetch_related(Prefetch(
+                'tags',
+                queryset=Tag.objects.only('id'),
+            )).order_by('-id'),
+            to_attr='limited_recipes',
+        ))
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            SubscriptionResolver.for_request(self.request).mark(
+                (author.id for author in page),
+                True,
+            )
+        return page